@@ -0,0 +1,6 @@
+try:
+    from .celery import app as celery_app  # Optional: async recognition
+except ImportError:
+    celery_app = None
+
+__all__ = ('celery_app',)
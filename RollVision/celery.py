@@ -0,0 +1,13 @@
+"""
+Celery application for RollVision
+Settings are read from Django settings with the CELERY_ prefix.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RollVision.settings')
+
+app = Celery('RollVision')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
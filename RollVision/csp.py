@@ -0,0 +1,29 @@
+"""
+Content Security Policy (CSP) directives for RollVision
+
+Kept out of settings.py so they are only built when
+SecurityHeadersMiddleware is enabled.
+"""
+# Allow Bootstrap CDN and necessary scripts for camera functionality
+CSP_DEFAULT_SRC = ("'self'",)
+CSP_SCRIPT_SRC = (
+    "'self'", 
+    "'unsafe-inline'",  # Required for inline scripts
+    "https://cdn.jsdelivr.net",  # Bootstrap CDN
+    "https://cdnjs.cloudflare.com",  # Additional CDN
+)
+CSP_STYLE_SRC = (
+    "'self'", 
+    "'unsafe-inline'",  # Required for inline styles
+    "https://cdn.jsdelivr.net",  # Bootstrap CDN
+    "https://cdnjs.cloudflare.com",  # Font Awesome
+    "https://fonts.googleapis.com",  # Google Fonts
+)
+CSP_FONT_SRC = (
+    "'self'",
+    "https://cdnjs.cloudflare.com",  # Font Awesome fonts
+    "https://fonts.gstatic.com",  # Google Fonts
+)
+CSP_IMG_SRC = ("'self'", "data:", "blob:")  # Allow data URLs for canvas/camera
+CSP_MEDIA_SRC = ("'self'", "blob:")  # Required for camera video stream
+CSP_CONNECT_SRC = ("'self'", "https://cdn.jsdelivr.net", "https://cdnjs.cloudflare.com")  # Allow CDN source maps
@@ -1,20 +1,26 @@
 from pathlib import Path
 import os
-from decouple import config, Csv
+import queue
+from decouple import AutoConfig, Csv
 from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Single config reader rooted at the project, so .env is located directly
+# instead of by inspecting the caller's frame and walking parent directories
+config = AutoConfig(search_path=str(BASE_DIR))
+
+DEBUG = config('DEBUG', default=False, cast=bool)
+
 # Security settings from environment variables
 # CRITICAL: These MUST be set in production - no defaults for security
 try:
     SECRET_KEY = config('SECRET_KEY')
 except:
-    if not config('DEBUG', default=False, cast=bool):
+    if not DEBUG:
         raise ImproperlyConfigured('SECRET_KEY environment variable is required in production')
     SECRET_KEY = 'django-insecure-dev-only-key-CHANGE-IN-PRODUCTION'
 
-DEBUG = config('DEBUG', default=False, cast=bool)
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=Csv())
 
 
@@ -33,6 +39,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'dashboard.middleware.SessionActivityMiddleware',
     'django.middleware.common.CommonMiddleware',
     # Temporarily disabled for login debugging
     # 'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,8 +78,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,  # Reuse connections so PRAGMAs run once per worker, not per request
+        'CONN_HEALTH_CHECKS': True,
         'OPTIONS': {
-            'timeout': 20,  # Increased timeout for concurrent requests (20 seconds)
+            'timeout': 20,  # SQLite busy_timeout: writers wait up to 20s for the lock instead of failing
         },
     }
 }
@@ -118,12 +127,17 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB max upload size
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024
 ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png']
 
+# Face recognition inference backend: 'cpu', 'cuda' or 'openvino' (falls back to CPU)
+FACE_DNN_BACKEND = config('FACE_DNN_BACKEND', default='cpu')
+
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Email Configuration (Gmail SMTP)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# In production mail is queued and sent over SMTP by a background thread
+EMAIL_QUEUE_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = EMAIL_QUEUE_BACKEND if DEBUG else 'dashboard.mail.QueuedEmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -160,8 +174,9 @@ SECURE_REFERRER_POLICY = 'same-origin'
 SECURE_CROSS_ORIGIN_OPENER_POLICY = 'same-origin'
 
 # Session Security
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'  # Read from cache, write through to DB
 SESSION_COOKIE_AGE = 3600  # 1 hour
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False  # Expiry is refreshed by SessionActivityMiddleware
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_HTTPONLY = True
 # CSRF_COOKIE_HTTPONLY moved to conditional block above
@@ -174,19 +189,44 @@ if not DEBUG:
             'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
             'OPTIONS': {
                 'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'PARSER_CLASS': 'redis.connection._HiredisParser',  # C RESP parser (needs hiredis)
+                'CONNECTION_POOL_KWARGS': {'max_connections': 50},
+                'IGNORE_EXCEPTIONS': True,  # Treat Redis outages as cache misses
             }
         }
     }
+    DJANGO_REDIS_IGNORE_EXCEPTIONS = True
 else:
-    # Use in-memory cache for development
+    # File-based cache for development so all runserver/gunicorn workers
+    # share one cache instead of each keeping a private LocMemCache
     CACHES = {
         'default': {
-            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-            'LOCATION': 'unique-snowflake',
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, '.django_cache'),
         }
     }
 
+# Celery (optional): with ASYNC_RECOGNITION on, live-session frames are
+# recognized by workers on the 'recognition' queue instead of in the request;
+# with ASYNC_TRAINING on, registrations queue face training on 'training'
+# instead of starting a thread in the web process
+ASYNC_RECOGNITION = config('ASYNC_RECOGNITION', default=False, cast=bool)
+ASYNC_TRAINING = config('ASYNC_TRAINING', default=False, cast=bool)
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://127.0.0.1:6379/2')
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=CELERY_BROKER_URL)
+CELERY_RESULT_EXPIRES = 300  # Frame results are polled within seconds
+CELERY_TASK_ROUTES = {
+    'dashboard.tasks.recognize_frame': {'queue': 'recognition'},
+    'dashboard.tasks.train_faces': {'queue': 'training'},
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1  # Frames are CPU-heavy; don't hoard them
+
 # Logging configuration
+# File output goes through a queue: request threads only enqueue records and a
+# QueueListener (started in DashboardConfig.ready) writes them to LOG_FILE.
+LOG_FILE = os.path.join(BASE_DIR, 'logs', 'django.log')
+LOG_QUEUE = queue.Queue(-1)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -199,9 +239,8 @@ LOGGING = {
     'handlers': {
         'file': {
             'level': 'ERROR',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'django.log'),
-            'formatter': 'verbose',
+            'class': 'logging.handlers.QueueHandler',
+            'queue': LOG_QUEUE,
         },
         'console': {
             'level': 'INFO',
@@ -227,28 +266,5 @@ LOGIN_URL = '/admin/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/admin/login/'
 
-# Content Security Policy (CSP) Settings
-# Allow Bootstrap CDN and necessary scripts for camera functionality
-CSP_DEFAULT_SRC = ("'self'",)
-CSP_SCRIPT_SRC = (
-    "'self'", 
-    "'unsafe-inline'",  # Required for inline scripts
-    "https://cdn.jsdelivr.net",  # Bootstrap CDN
-    "https://cdnjs.cloudflare.com",  # Additional CDN
-)
-CSP_STYLE_SRC = (
-    "'self'", 
-    "'unsafe-inline'",  # Required for inline styles
-    "https://cdn.jsdelivr.net",  # Bootstrap CDN
-    "https://cdnjs.cloudflare.com",  # Font Awesome
-    "https://fonts.googleapis.com",  # Google Fonts
-)
-CSP_FONT_SRC = (
-    "'self'",
-    "https://cdnjs.cloudflare.com",  # Font Awesome fonts
-    "https://fonts.gstatic.com",  # Google Fonts
-)
-CSP_IMG_SRC = ("'self'", "data:", "blob:")  # Allow data URLs for canvas/camera
-CSP_MEDIA_SRC = ("'self'", "blob:")  # Required for camera video stream
-CSP_CONNECT_SRC = ("'self'", "https://cdn.jsdelivr.net", "https://cdnjs.cloudflare.com")  # Allow CDN source maps
-
+# Content Security Policy (CSP) directives live in RollVision/csp.py and are
+# only imported by SecurityHeadersMiddleware when it is enabled.
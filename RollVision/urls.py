@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.decorators.csrf import csrf_exempt
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -14,4 +15,5 @@ if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0] if settings.STATICFILES_DIRS else None)
     
     # Temporary CSRF fix for admin login in development
-    import dashboard.csrf_fix
+    # (must precede the admin include so it matches first)
+    urlpatterns.insert(0, path('admin/login/', csrf_exempt(admin.site.login)))
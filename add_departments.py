@@ -1,9 +1,11 @@
 import os
+import sys
 import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RollVision.settings')
 django.setup()
 
+from django.db import transaction
 from dashboard.models import Department
 
 # Add departments
@@ -15,16 +17,26 @@ departments = [
     {'name': 'Master of Computer Applications', 'code': 'MCA'},
 ]
 
-for dept_data in departments:
-    dept, created = Department.objects.get_or_create(
-        code=dept_data['code'],
-        defaults={'name': dept_data['name']}
+# Single SELECT for reporting, then one multi-row INSERT in one transaction
+existing = dict(
+    Department.objects.filter(code__in=[d['code'] for d in departments]).values_list('code', 'name')
+)
+with transaction.atomic():
+    Department.objects.bulk_create(
+        [Department(code=d['code'], name=d['name']) for d in departments if d['code'] not in existing],
+        ignore_conflicts=True
     )
-    if created:
-        print(f"✅ Created: {dept.name} ({dept.code})")
+
+msgs = []
+for dept_data in departments:
+    if dept_data['code'] not in existing:
+        msgs.append(f"✅ Created: {dept_data['name']} ({dept_data['code']})")
     else:
-        print(f"ℹ️  Already exists: {dept.name} ({dept.code})")
+        msgs.append(f"ℹ️  Already exists: {existing[dept_data['code']]} ({dept_data['code']})")
 
-print("\n📋 All departments in database:")
-for d in Department.objects.all().order_by('code'):
-    print(f"  - {d.code}: {d.name}")
+msgs.append("\n📋 All departments in database:")
+msgs.extend(
+    f"  - {code}: {name}"
+    for code, name in Department.objects.order_by('code').values_list('code', 'name')
+)
+sys.stdout.write('\n'.join(msgs) + '\n')
@@ -1,10 +1,12 @@
 import os
+import sys
 import django
 from datetime import time
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RollVision.settings')
 django.setup()
 
+from django.db import transaction
 from dashboard.models import LecturePeriod
 
 # Add lecture periods with breaks
@@ -19,20 +21,27 @@ periods = [
     {'period_number': 6, 'start_time': time(15, 0), 'end_time': time(16, 0), 'name': 'Period 6'},
 ]
 
-for period_data in periods:
-    period, created = LecturePeriod.objects.get_or_create(
-        period_number=period_data['period_number'],
-        defaults={
-            'name': period_data['name'],
-            'start_time': period_data['start_time'],
-            'end_time': period_data['end_time']
-        }
+# Single SELECT for reporting, then one multi-row INSERT in one transaction
+existing = LecturePeriod.objects.filter(
+    period_number__in=[p['period_number'] for p in periods]
+).in_bulk(field_name='period_number')
+with transaction.atomic():
+    LecturePeriod.objects.bulk_create(
+        [LecturePeriod(**p) for p in periods if p['period_number'] not in existing],
+        ignore_conflicts=True
     )
-    if created:
-        print(f"✅ Created: {period.name} ({period.start_time.strftime('%I:%M %p')} - {period.end_time.strftime('%I:%M %p')})")
+
+msgs = []
+for period_data in periods:
+    period = existing.get(period_data['period_number'])
+    if period is None:
+        msgs.append(f"✅ Created: {period_data['name']} ({period_data['start_time'].strftime('%I:%M %p')} - {period_data['end_time'].strftime('%I:%M %p')})")
     else:
-        print(f"ℹ️  Already exists: {period.name} ({period.start_time.strftime('%I:%M %p')} - {period.end_time.strftime('%I:%M %p')})")
+        msgs.append(f"ℹ️  Already exists: {period.name} ({period.start_time.strftime('%I:%M %p')} - {period.end_time.strftime('%I:%M %p')})")
 
-print("\n📋 All lecture periods:")
-for p in LecturePeriod.objects.all().order_by('period_number'):
-    print(f"  - {p.name}: {p.start_time.strftime('%I:%M %p')} - {p.end_time.strftime('%I:%M %p')}")
+msgs.append("\n📋 All lecture periods:")
+msgs.extend(
+    f"  - {name}: {start.strftime('%I:%M %p')} - {end.strftime('%I:%M %p')}"
+    for name, start, end in LecturePeriod.objects.order_by('period_number').values_list('name', 'start_time', 'end_time')
+)
+sys.stdout.write('\n'.join(msgs) + '\n')
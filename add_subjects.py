@@ -1,9 +1,11 @@
 import os
+import sys
 import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RollVision.settings')
 django.setup()
 
+from django.db import transaction
 from dashboard.models import Subject, Department
 
 # Get CS department
@@ -17,21 +19,26 @@ subjects = [
     {'name': 'Deep Learning', 'code': 'DL', 'credits': 4, 'semester': 8},
 ]
 
-for subj_data in subjects:
-    subj, created = Subject.objects.get_or_create(
-        code=subj_data['code'],
-        defaults={
-            'name': subj_data['name'],
-            'credits': subj_data['credits'],
-            'semester': subj_data['semester'],
-            'department': cs_dept
-        }
+# Single SELECT for reporting, then one multi-row INSERT in one transaction
+existing = dict(
+    Subject.objects.filter(code__in=[s['code'] for s in subjects]).values_list('code', 'name')
+)
+with transaction.atomic():
+    Subject.objects.bulk_create(
+        [Subject(department=cs_dept, **s) for s in subjects if s['code'] not in existing],
+        ignore_conflicts=True
     )
-    if created:
-        print(f"✅ Created: {subj.code} - {subj.name}")
+
+msgs = []
+for subj_data in subjects:
+    if subj_data['code'] not in existing:
+        msgs.append(f"✅ Created: {subj_data['code']} - {subj_data['name']}")
     else:
-        print(f"ℹ️  Already exists: {subj.code} - {subj.name}")
+        msgs.append(f"ℹ️  Already exists: {subj_data['code']} - {existing[subj_data['code']]}")
 
-print("\n📋 All subjects in database:")
-for s in Subject.objects.all().order_by('code'):
-    print(f"  - {s.code}: {s.name} ({s.credits} credits)")
+msgs.append("\n📋 All subjects in database:")
+msgs.extend(
+    f"  - {code}: {name} ({credits} credits)"
+    for code, name, credits in Subject.objects.order_by('code').values_list('code', 'name', 'credits')
+)
+sys.stdout.write('\n'.join(msgs) + '\n')
@@ -1,6 +1,66 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
 from django.apps import AppConfig
+from django.conf import settings
+
+from .log_handlers import BufferedRotatingFileHandler
+
+_log_listener = None
+
+
+def _start_log_listener():
+    """Drain LOG_QUEUE to the log file on a background thread"""
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    verbose = settings.LOGGING['formatters']['verbose']
+    file_handler = BufferedRotatingFileHandler(
+        settings.LOG_FILE,
+        maxBytes=50 * 1024 * 1024,  # 50MB
+        backupCount=5
+    )
+    file_handler.setFormatter(logging.Formatter(verbose['format'], style=verbose['style']))
+
+    _log_listener = QueueListener(settings.LOG_QUEUE, file_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+
+def restart_log_listener():
+    """
+    Give a forked process (gunicorn --preload worker) its own log queue
+    The listener thread started in the master doesn't survive fork(), so
+    the inherited queue would only grow; point the QueueHandlers at a fresh
+    queue and start a listener for it in this process.
+    """
+    global _log_listener
+    old_queue = settings.LOG_QUEUE
+    log_queue = queue.Queue(-1)
+
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    ]
+    for logger in loggers:
+        for handler in logger.handlers:
+            if isinstance(handler, QueueHandler) and handler.queue is old_queue:
+                handler.queue = log_queue
+
+    settings.LOG_QUEUE = log_queue
+    _log_listener = None
+    _start_log_listener()
 
 
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        _start_log_listener()
+
+        # Register signal handlers
+        from . import signals  # noqa: F401
@@ -1,7 +1,17 @@
+from django.core.cache import cache
+
 from .models import SystemSettings
 
+THEME_CACHE_KEY = "rv:theme"
+THEME_CACHE_TIMEOUT = 3600  # Invalidated on save, so this is only a safety net
+
+
+def _load_theme():
+    # SELECT theme ... LIMIT 1, returned as a bare string (no model instance)
+    return SystemSettings.objects.values_list("theme", flat=True).first() or "light"
+
+
 def theme_context(request):
-    settings_obj = SystemSettings.objects.first()
     return {
-        "theme": settings_obj.theme if settings_obj else "light"
+        "theme": cache.get_or_set(THEME_CACHE_KEY, _load_theme, THEME_CACHE_TIMEOUT)
     }
@@ -2,6 +2,7 @@
 Custom decorators for API security and validation
 """
 import functools
+import json
 import logging
 from django.http import JsonResponse
 from django.shortcuts import render
@@ -9,8 +10,27 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 
+from .utils import get_client_ip
+
+try:
+    import orjson  # Optional: faster C parser
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+_JSON_PREFIXES = ('application/json', 'application/vnd.api+json')
+
+
+def _wants_json(request):
+    """Check whether the client expects a JSON response, memoized on the request"""
+    wants_json = getattr(request, '_wants_json', None)
+    if wants_json is None:
+        wants_json = request.META.get('HTTP_ACCEPT', '').startswith(_JSON_PREFIXES)
+        request._wants_json = wants_json
+    return wants_json
+
 
 def audit_log(view_func):
     """
@@ -18,19 +38,24 @@ def audit_log(view_func):
     """
     @functools.wraps(view_func)
     def wrapper(request, *args, **kwargs):
+        # Skip all log formatting work when INFO is filtered out (production)
+        if not logger.isEnabledFor(logging.INFO):
+            try:
+                return view_func(request, *args, **kwargs)
+            except Exception as e:
+                logger.error("API_ERROR: %s | Error: %s", view_func.__name__, e)
+                raise
+
         # Get client IP
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
+        ip = get_client_ip(request)
         
         # Log the API call
         logger.info(
-            f"API_CALL: {view_func.__name__} | "
-            f"IP: {ip} | "
-            f"User: {getattr(request.user, 'username', 'anonymous')} | "
-            f"Method: {request.method}"
+            "API_CALL: %s | IP: %s | User: %s | Method: %s",
+            view_func.__name__,
+            ip,
+            getattr(request.user, 'username', 'anonymous'),
+            request.method
         )
         
         try:
@@ -38,12 +63,12 @@ def audit_log(view_func):
             
             # Log successful response
             if hasattr(response, 'status_code'):
-                logger.info(f"API_RESPONSE: {view_func.__name__} | Status: {response.status_code}")
+                logger.info("API_RESPONSE: %s | Status: %s", view_func.__name__, response.status_code)
             
             return response
         except Exception as e:
             # Log error
-            logger.error(f"API_ERROR: {view_func.__name__} | Error: {str(e)}")
+            logger.error("API_ERROR: %s | Error: %s", view_func.__name__, e)
             raise
     
     return wrapper
@@ -52,6 +77,8 @@ def audit_log(view_func):
 def validate_json_request(view_func):
     """
     Decorator to validate that request contains valid JSON
+    The parsed body is stored on request._cached_json; decorated views
+    should read it from there instead of calling json.loads(request.body)
     """
     @functools.wraps(view_func)
     def wrapper(request, *args, **kwargs):
@@ -65,13 +92,20 @@ def validate_json_request(view_func):
                 }, status=400)
             
             try:
-                # Try to access request.body to ensure it's valid
-                _ = request.body
+                body = request.body
             except Exception:
                 return JsonResponse({
                     'success': False,
                     'message': 'Invalid request body'
                 }, status=400)
+            
+            try:
+                request._cached_json = _json_loads(body)
+            except ValueError:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Invalid JSON'
+                }, status=400)
         
         return view_func(request, *args, **kwargs)
     
@@ -87,9 +121,9 @@ def require_staff(view_func):
     @login_required
     def wrapper(request, *args, **kwargs):
         if not request.user.is_staff:
-            logger.warning(f"Unauthorized access attempt by {request.user.username} to {view_func.__name__}")
+            logger.warning("Unauthorized access attempt by %s to %s", request.user.username, view_func.__name__)
             # Check if it's an API request (expects JSON) or web page
-            if request.META.get('HTTP_ACCEPT', '').startswith('application/json'):
+            if _wants_json(request):
                 return JsonResponse({
                     'success': False,
                     'message': 'Staff permissions required'
@@ -112,11 +146,27 @@ def sanitize_input(max_length=1000):
         @functools.wraps(view_func)
         def wrapper(request, *args, **kwargs):
             # For POST requests, sanitize common input fields
-            if request.method == 'POST' and hasattr(request, 'POST'):
-                # Check for excessively long inputs
-                for key, value in request.POST.items():
-                    if isinstance(value, str) and len(value) > max_length:
-                        logger.warning(f"Input too long for field {key}: {len(value)} chars")
+            if request.method == 'POST':
+                # Cheap upfront gate on non-multipart bodies: anything larger than
+                # 64 max-length fields is rejected before the form is parsed
+                if not request.META.get('CONTENT_TYPE', '').startswith('multipart/'):
+                    try:
+                        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+                    except ValueError:
+                        content_length = 0
+                    if content_length > max_length * 64:
+                        logger.warning("Request body too large: %s bytes", content_length)
+                        return JsonResponse({
+                            'success': False,
+                            'message': 'Request body too large'
+                        }, status=413)
+                
+                # Check for excessively long inputs (uploaded files live in
+                # request.FILES, so only text fields are scanned here)
+                for key in request.POST.keys():
+                    length = len(request.POST.get(key, ''))
+                    if length > max_length:
+                        logger.warning("Input too long for field %s: %s chars", key, length)
                         return JsonResponse({
                             'success': False,
                             'message': f'Input too long for field {key}'
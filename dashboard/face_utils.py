@@ -6,13 +6,28 @@ Uses OpenCV DNN SFace (State-of-the-Art) for high accuracy.
 import cv2
 import numpy as np
 import os
-import json
 import base64
 import secrets
 import time
+import threading
 import logging
 from django.conf import settings
 
+try:
+    import simsimd  # Optional: SIMD cosine kernels
+except ImportError:
+    simsimd = None
+
+try:
+    import faiss  # Optional: sub-linear search for large galleries
+except ImportError:
+    faiss = None
+
+try:
+    import numba  # Optional: compiled match/score kernel
+except ImportError:
+    numba = None
+
 logger = logging.getLogger(__name__)
 
 # ==================== Configuration ====================
@@ -24,6 +39,145 @@ FACE_MIN_SIZE = (80, 80)
 ENABLE_PREPROCESSING = True
 ENABLE_QUALITY_CHECKS = True
 
+SSD_INPUT_SIZE = (300, 300)
+SSD_MEAN = np.array((104.0, 177.0, 123.0), dtype=np.float32)  # BGR
+SFACE_INPUT_SIZE = (112, 112)
+
+# OpenCV's CPU thread pool size; leave headroom for concurrent requests.
+# gunicorn.conf.py sets OMP_NUM_THREADS to split the cores between workers.
+DNN_NUM_THREADS = int(os.environ.get('OMP_NUM_THREADS') or max(1, (os.cpu_count() or 2) // 2))
+
+# Optional inference backends selected by settings.FACE_DNN_BACKEND
+DNN_BACKENDS = {
+    'cuda': (cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA_FP16),
+    # Intel OpenVINO: layer fusion and AVX-512/VNNI kernels on CPU
+    'openvino': (cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE, cv2.dnn.DNN_TARGET_CPU),
+}
+
+# Above this many known encodings, match through a FAISS HNSW index
+FAISS_MIN_ENCODINGS = 500
+FAISS_HNSW_M = 32
+FAISS_EF_SEARCH = 64
+
+# Streaming frames: run SSD every Nth frame and follow faces in between
+TRACK_REDETECT_EVERY = 5   # frames
+TRACK_MAX_AGE = 2.0        # seconds without a frame before a stream is re-detected
+TRACK_MIN_SCORE = 0.6      # template match score below which we re-detect
+TRACK_SCALE = 0.25         # follow faces on a quarter-size grayscale frame
+TRACK_STATIC_BITS = 4      # dHash bits (of 64) a frame may differ by and still count as unchanged
+
+EMBEDDING_DIM = 128  # SFace output size
+
+# Stored encoding formats: 1-byte header followed by the raw vector bytes
+ENCODING_FORMAT_F32 = 1   # 128 float32 values
+ENCODING_FORMAT_I8 = 2    # 128 int8 values, round(v * 127)
+
+def quantize_embedding(vec):
+    """Map unit-vector components in [-1, 1] to int8"""
+    return np.round(vec * 127).astype(np.int8)
+
+def pack_encoding(vec):
+    """Serialize a unit embedding for FaceEncoding.encoding_data (int8, 129 bytes)"""
+    return bytes((ENCODING_FORMAT_I8,)) + quantize_embedding(vec).tobytes()
+
+def unpack_encoding(data):
+    """
+    Decode FaceEncoding.encoding_data
+    Returns (float32 unit vector, int8 vector), or None for placeholder and
+    unknown rows.
+    """
+    if not data:
+        return None
+    data = bytes(data)
+    header = data[0]
+    if header == ENCODING_FORMAT_I8:
+        vec_i8 = np.frombuffer(data, dtype=np.int8, offset=1)
+        vec = vec_i8.astype(np.float32)
+        vec *= 1.0 / np.sqrt(np.vdot(vec, vec))
+        return vec, vec_i8
+    if header == ENCODING_FORMAT_F32:
+        vec = np.frombuffer(data, dtype=np.float32, offset=1)
+        return vec, quantize_embedding(vec)
+    return None
+
+def int8_scale(vecs_i8):
+    """Per-row 1 / L2 norm of int8 vectors, so dot * scale_a * scale_b is the cosine"""
+    vecs = vecs_i8.astype(np.float32)
+    return 1.0 / np.sqrt(np.maximum(np.einsum('...i,...i->...', vecs, vecs), 1.0))
+
+def dhash(gray):
+    """64-bit difference hash of a grayscale image, as an int"""
+    thumb = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(thumb[:, 1:] > thumb[:, :-1]).tobytes(), 'big')
+
+def cosine_similarity(queries, known):
+    """
+    Cosine similarity between every row of `queries` (F, D) and `known` (N, D)
+    Returns an (F, N) matrix. Uses SimSIMD when installed (float32 or int8
+    inputs), else a NumPy GEMM on float32 unit vectors, where the dot
+    product is the cosine (and ||p - v||^2 = 2 - 2 * p.v, so ranking by it
+    is ranking by Euclidean distance too).
+    """
+    if simsimd is not None:
+        return 1.0 - np.asarray(simsimd.cdist(queries, known, metric='cosine'))
+    return queries @ known.T
+
+def int8_cosine_similarity(queries_i8, known_i8, known_scale):
+    """
+    cosine_similarity for int8 rows using SimSIMD's integer dot product
+    (VNNI on recent x86) and precomputed per-row scales (int8_scale), so
+    gallery norms aren't recomputed on every call
+    """
+    dots = np.asarray(simsimd.cdist(queries_i8, known_i8, metric='inner'))
+    return dots * int8_scale(queries_i8)[:, None] * known_scale
+
+def _match_and_score(scores, thr):
+    """
+    Fused row-wise argmax, threshold and confidence over `scores` (F, N)
+    Returns (best_idxs, best_scores, confidences); best_idxs is -1 where the
+    best score doesn't clear `thr`. Confidence maps thr -> 50% and
+    1.0 -> 100% for matches, 0 -> 0% and thr -> 50% otherwise.
+    """
+    n_faces, n_known = scores.shape
+    best_idxs = np.empty(n_faces, np.int64)
+    best_scores = np.empty(n_faces, np.float32)
+    confidences = np.empty(n_faces, np.float32)
+    for i in range(n_faces):
+        best = -np.inf
+        bi = -1
+        for j in range(n_known):
+            s = scores[i, j]
+            if s > best:
+                best = s
+                bi = j
+        best_scores[i] = best
+        if best > thr:
+            best_idxs[i] = bi
+            conf = 50.0 + ((best - thr) / (1.0 - thr)) * 50.0
+            confidences[i] = min(100.0, max(0.0, conf))
+        else:
+            best_idxs[i] = -1
+            confidences[i] = (best / thr) * 50.0
+    return best_idxs, best_scores, confidences
+
+def _match_and_score_numpy(scores, thr):
+    """NumPy equivalent of _match_and_score for when Numba isn't installed"""
+    best_idxs = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(scores)), best_idxs].astype(np.float32)
+    matched = best_scores > thr
+    confidences = np.where(
+        matched,
+        np.clip(50.0 + ((best_scores - thr) / (1.0 - thr)) * 50.0, 0.0, 100.0),
+        (best_scores / thr) * 50.0,
+    ).astype(np.float32)
+    return np.where(matched, best_idxs, -1), best_scores, confidences
+
+# A single pass over the scores instead of argmax, gather and per-row Python
+if numba is not None:
+    match_and_score = numba.njit(cache=True, fastmath=True)(_match_and_score)
+else:
+    match_and_score = _match_and_score_numpy
+
 class FaceDetectionError(Exception):
     """Custom exception for face detection errors"""
     pass
@@ -32,10 +186,29 @@ class FaceRecognizer:
     """Handle face detection and SFace recognition"""
     
     def __init__(self):
-        self.known_face_encodings = []
+        # Contiguous (N, 128) galleries: views over the first N rows of
+        # buffers that add_encoding grows geometrically
+        self._known_buf = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self._known_buf_i8 = np.empty((0, EMBEDDING_DIM), dtype=np.int8)
+        self.known_mat = self._known_buf
+        self.known_mat_i8 = self._known_buf_i8
+        self._known_scale_buf = np.empty(0, dtype=np.float32)
+        self.known_scale = self._known_scale_buf
         self.known_face_ids = []
+        self.faiss_index = None
+        # Per-(class_year, division_id) slices of the gallery for live sessions;
+        # the generation is bumped whenever they are dropped
+        self._class_galleries = {}
+        self._class_generation = 0
+        # Serializes gallery writers, and FAISS search against index.add
+        self._gallery_lock = threading.Lock()
         self._is_trained = False
         self.detection_model = "opencv_sface_2021"
+        # Nets hold their input/output state, so one forward at a time
+        self._lock = threading.RLock()
+        # Per-stream face tracks for track_faces()
+        self._tracks = {}
+        self._tracks_lock = threading.Lock()
         
         # Paths
         models_dir = os.path.join(settings.BASE_DIR, 'dashboard', 'models')
@@ -47,43 +220,111 @@ class FaceRecognizer:
         # Recognition Model (SFace)
         self.sface_path = os.path.join(models_dir, 'face_recognition_sface_2021dec.onnx')
         
-        # Load Networks
-        try:
-            self.detector = cv2.dnn.readNetFromCaffe(self.proto_path, self.model_path)
-            self.recognizer = cv2.dnn.readNetFromONNX(self.sface_path)
-            logger.info("OpenCV SFace Models loaded successfully.")
-        except Exception as e:
-            logger.error(f"Failed to load DNN models: {e}")
-            self.detector = None
-            self.recognizer = None
-            
+        self.load_models()
+        
         # Initialize Cache
         self.refresh_encodings()
 
+    def load_models(self, num_threads=DNN_NUM_THREADS):
+        """
+        (Re)load the detection and recognition nets
+        Called from __init__, and from the gunicorn post_fork hook so each
+        worker gets its own nets rather than ones inherited across fork().
+        """
+        with self._lock:
+            try:
+                self.detector = cv2.dnn.readNetFromCaffe(self.proto_path, self.model_path)
+                self.recognizer = cv2.dnn.readNetFromONNX(self.sface_path)
+                logger.info("OpenCV SFace Models loaded successfully.")
+            except Exception as e:
+                logger.error(f"Failed to load DNN models: {e}")
+                self.detector = None
+                self.recognizer = None
+            
+            cv2.setNumThreads(num_threads)
+            if self.detector is not None:
+                self._select_backend(getattr(settings, 'FACE_DNN_BACKEND', 'cpu'))
+
+    def warm_up(self):
+        """Run one dummy forward per net so backend errors surface now"""
+        with self._lock:
+            self.detector.setInput(np.zeros((1, 3) + SSD_INPUT_SIZE[::-1], dtype=np.float32))
+            self.detector.forward()
+            self.recognizer.setInput(np.zeros((1, 3) + SFACE_INPUT_SIZE[::-1], dtype=np.float32))
+            self.recognizer.forward()
+
+    def _select_backend(self, backend):
+        """
+        Move both nets to the requested inference backend ('cpu', 'cuda' or
+        'openvino'). Falls back to the default OpenCV CPU backend if the
+        requested one is unavailable.
+        """
+        if backend in DNN_BACKENDS:
+            try:
+                if backend == 'cuda' and cv2.cuda.getCudaEnabledDeviceCount() == 0:
+                    raise RuntimeError("no CUDA device")
+                dnn_backend, dnn_target = DNN_BACKENDS[backend]
+                for net in (self.detector, self.recognizer):
+                    net.setPreferableBackend(dnn_backend)
+                    net.setPreferableTarget(dnn_target)
+                self.warm_up()
+                if backend == 'cuda':
+                    # Convolutions run on the GPU; keep CPU threads from contending
+                    cv2.setNumThreads(1)
+                logger.info(f"Face DNN backend: {backend}")
+                return
+            except Exception as e:
+                logger.warning(f"{backend} backend unavailable, using CPU: {e}")
+        
+        for net in (self.detector, self.recognizer):
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
     def refresh_encodings(self):
         """Load all valid encodings from DB into memory"""
         try:
             from dashboard.models import FaceEncoding
             
-            encodings = FaceEncoding.objects.filter(is_active=True).select_related('student')
+            encodings = FaceEncoding.objects.filter(is_active=True)
+            
+            # Size the matrices up front and fill rows in place
+            total = encodings.count()
+            known_mat = np.empty((total, EMBEDDING_DIM), dtype=np.float32)
+            known_mat_i8 = np.empty((total, EMBEDDING_DIM), dtype=np.int8)
+            known_face_ids = []
             
-            self.known_face_encodings = []
-            self.known_face_ids = []
+            # Stream unordered (bytes, student_id) tuples instead of building model instances
+            rows = encodings.order_by().values_list('encoding_data', 'student__student_id').iterator(chunk_size=2000)
             
             count = 0
-            for enc in encodings:
+            for encoding_data, student_id in rows:
+                if count == total:
+                    break
                 try:
-                    data = json.loads(enc.encoding_data)
-                    # Handle version differences
-                    if isinstance(data, dict):
-                        if data.get('version') == 'opencv_sface_v1':
-                            vec = np.array(data['encoding'])
-                            self.known_face_encodings.append(vec)
-                            self.known_face_ids.append(enc.student.student_id)
-                            count += 1
-                    # Old versions skipped (must retrain)
+                    decoded = unpack_encoding(encoding_data)
+                    if decoded is None:
+                        # Placeholder or old-format row (must retrain)
+                        continue
+                    known_mat[count], known_mat_i8[count] = decoded
+                    known_face_ids.append(student_id)
+                    count += 1
                 except Exception as e:
-                    logger.error(f"Failed to load encoding for {enc.student.student_id}: {e}")
+                    logger.error(f"Failed to load encoding for {student_id}: {e}")
+            
+            known_scale = np.empty(total, dtype=np.float32)
+            known_scale[:count] = int8_scale(known_mat_i8[:count])
+            
+            # Swap in the new gallery in one step
+            faiss_index = self._build_faiss_index(known_mat[:count])
+            with self._gallery_lock:
+                self._known_buf, self._known_buf_i8 = known_mat, known_mat_i8
+                self._known_scale_buf = known_scale
+                self.known_mat = known_mat[:count]
+                self.known_mat_i8 = known_mat_i8[:count]
+                self.known_scale = known_scale[:count]
+                self.known_face_ids = known_face_ids
+                self.faiss_index = faiss_index
+                self._drop_class_galleries()
             
             self._is_trained = (count > 0)
             logger.info(f"Loaded {count} SFace encodings into memory.")
@@ -93,6 +334,228 @@ class FaceRecognizer:
             logger.error(f"Error refreshing encodings: {e}")
             return False
 
+    def add_encoding(self, student_id, encoding_data):
+        """
+        Append one stored encoding (FaceEncoding.encoding_data) to the
+        in-memory gallery so a new registration is recognizable without
+        reloading every encoding. Use refresh_encodings after deletes.
+        """
+        decoded = unpack_encoding(encoding_data)
+        if decoded is None:
+            return False
+        
+        with self._gallery_lock:
+            count = len(self.known_face_ids)
+            if count == len(self._known_buf):
+                # Out of room: double the buffers, like a C++ vector
+                capacity = max(16, 2 * count)
+                known_buf = np.empty((capacity, EMBEDDING_DIM), dtype=np.float32)
+                known_buf_i8 = np.empty((capacity, EMBEDDING_DIM), dtype=np.int8)
+                known_buf[:count] = self.known_mat
+                known_buf_i8[:count] = self.known_mat_i8
+                known_scale_buf = np.empty(capacity, dtype=np.float32)
+                known_scale_buf[:count] = self.known_scale
+                self._known_buf, self._known_buf_i8 = known_buf, known_buf_i8
+                self._known_scale_buf = known_scale_buf
+            
+            # Fill the row past the published views first, then publish it
+            self._known_buf[count], self._known_buf_i8[count] = decoded
+            self._known_scale_buf[count] = int8_scale(decoded[1])
+            self.known_face_ids.append(student_id)
+            self.known_mat = self._known_buf[:count + 1]
+            # Scales before rows: readers trim known_scale to known_mat_i8
+            self.known_scale = self._known_scale_buf[:count + 1]
+            self.known_mat_i8 = self._known_buf_i8[:count + 1]
+            
+            if self.faiss_index is not None:
+                self.faiss_index.add(self.known_mat[count:])
+            elif count + 1 > FAISS_MIN_ENCODINGS:
+                self.faiss_index = self._build_faiss_index(self.known_mat)
+            self._drop_class_galleries()
+        
+        self._is_trained = True
+        return True
+
+    def class_gallery(self, class_year, division_id):
+        """
+        (known_mat, known_mat_i8, known_scale, known_face_ids) restricted to the active
+        students of one class/division (plus those with no division), the
+        same roster a live session shows. Built on first use and kept until
+        the gallery or a student/encoding changes.
+        """
+        key = (class_year, division_id)
+        gallery = self._class_galleries.get(key)
+        if gallery is not None:
+            return gallery
+        
+        from django.db.models import Q
+        from dashboard.models import Student
+        
+        # A registration or invalidation landing while the roster is read
+        # bumps the generation; the slice is then used once but not cached
+        generation = self._class_generation
+        roster = set(Student.objects.filter(
+            class_year=class_year,
+            is_active=True
+        ).filter(
+            Q(division_id=division_id) | Q(division__isnull=True)
+        ).values_list('student_id', flat=True))
+        
+        with self._gallery_lock:
+            rows = [i for i, student_id in enumerate(self.known_face_ids) if student_id in roster]
+            # Fancy indexing copies the rows into fresh contiguous matrices
+            gallery = (self.known_mat[rows], self.known_mat_i8[rows], self.known_scale[rows],
+                       [self.known_face_ids[i] for i in rows])
+            if generation == self._class_generation:
+                self._class_galleries[key] = gallery
+        return gallery
+
+    def invalidate_class_galleries(self):
+        """Drop the per-class galleries; they are rebuilt on next use"""
+        with self._gallery_lock:
+            self._drop_class_galleries()
+
+    def _drop_class_galleries(self):
+        # Caller holds _gallery_lock
+        self._class_galleries = {}
+        self._class_generation += 1
+
+    @staticmethod
+    def _build_faiss_index(known_mat):
+        """HNSW inner-product index over known_mat, or None for small galleries"""
+        if faiss is None or len(known_mat) <= FAISS_MIN_ENCODINGS:
+            return None
+        index = faiss.IndexHNSWFlat(EMBEDDING_DIM, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = FAISS_EF_SEARCH
+        index.add(known_mat)
+        return index
+
+    def _gallery_snapshot(self):
+        """
+        (known_mat, known_mat_i8, known_scale, known_face_ids, faiss_index)
+        of the full gallery, read together so a concurrent refresh_encodings
+        can't pair match indices from one gallery with another's ids
+        """
+        with self._gallery_lock:
+            return self.known_mat, self.known_mat_i8, self.known_scale, self.known_face_ids, self.faiss_index
+
+    def _best_matches(self, embs, gallery):
+        """
+        Top-1 match for each row of `embs` (F, 128) against `gallery`, a
+        _gallery_snapshot() (or a class_gallery() with a None index).
+        Returns (best_idxs, best_scores, confidences), each of length F;
+        best_idxs is -1 for faces below FACE_MATCH_THRESHOLD.
+        """
+        known_mat, known_mat_i8, known_scale, _, faiss_index = gallery
+        
+        if faiss_index is not None:
+            with self._gallery_lock:
+                best_scores, best_idxs = faiss_index.search(embs, 1)
+            # Scoring the single result column returns 0 or -1; map 0 back to the gallery index
+            matched, best_scores, confidences = match_and_score(best_scores, FACE_MATCH_THRESHOLD)
+            return np.where(matched == 0, best_idxs[:, 0], -1), best_scores, confidences
+        
+        # Score every face against every known encoding in one call;
+        # SimSIMD's int8 kernel scans 4x less memory than float32
+        if simsimd is not None:
+            scores = int8_cosine_similarity(
+                quantize_embedding(embs), known_mat_i8, known_scale[:len(known_mat_i8)]) # Shape: (F, N)
+        else:
+            scores = cosine_similarity(embs, known_mat) # Shape: (F, N)
+        return match_and_score(scores, FACE_MATCH_THRESHOLD)
+
+    @property
+    def known_face_encodings(self):
+        """Known float32 embeddings, shape (N, 128)"""
+        return self.known_mat
+
+    def track_faces(self, image, stream_key):
+        """
+        (face rects, static, frame hash) for one frame of a stream (e.g. a
+        live session)
+        Runs the SSD detector every TRACK_REDETECT_EVERY frames and follows
+        the faces with template matching on a small grayscale frame in
+        between. Falls back to detection when a stream is new or stale, or
+        a face can't be followed. Once the caller has fully handled a
+        located frame it passes the hash to confirm_frame; until the track
+        is TRACK_MAX_AGE old, frames whose dHash is within TRACK_STATIC_BITS
+        of it reuse its rects and are reported static, so callers can skip
+        recognizing them too.
+        """
+        now = time.monotonic()
+        small = cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), None, fx=TRACK_SCALE, fy=TRACK_SCALE)
+        frame_hash = dhash(small)
+        
+        with self._tracks_lock:
+            track = self._tracks.get(stream_key)
+        
+        live = track is not None and now - track['time'] <= TRACK_MAX_AGE
+        if (live and track['hash'] is not None
+                and (frame_hash ^ track['hash']).bit_count() <= TRACK_STATIC_BITS):
+            # Scene hasn't changed since a confirmed frame. The track's time
+            # isn't refreshed, so a still scene is re-located (and
+            # re-recognized) at least every TRACK_MAX_AGE seconds
+            return track['rects'], True, frame_hash
+        
+        faces = None
+        frames = 0
+        if live and track['rects'] and track['frames'] < TRACK_REDETECT_EVERY:
+            faces = self._follow_faces(small, track)
+            frames = track['frames'] + 1
+        if faces is None:
+            faces = self.detect_faces(image)
+            frames = 0
+        
+        templates = []
+        for (x, y, w, h) in faces:
+            sx, sy = int(x * TRACK_SCALE), int(y * TRACK_SCALE)
+            templates.append(small[max(0, sy):sy + int(h * TRACK_SCALE), max(0, sx):sx + int(w * TRACK_SCALE)].copy())
+        
+        with self._tracks_lock:
+            # Drop streams that stopped sending frames
+            for key in [k for k, t in self._tracks.items() if now - t['time'] > TRACK_MAX_AGE]:
+                del self._tracks[key]
+            self._tracks[stream_key] = {
+                'rects': faces, 'templates': templates, 'frames': frames, 'time': now,
+                'hash': None, 'pending_hash': frame_hash
+            }
+        
+        return faces, False, frame_hash
+
+    def confirm_frame(self, stream_key, frame_hash):
+        """
+        Make a located frame the stream's static reference, once its faces
+        were all recognized and marked. Ignored if a later frame has been
+        located since.
+        """
+        with self._tracks_lock:
+            track = self._tracks.get(stream_key)
+            if track is not None and track['pending_hash'] == frame_hash:
+                track['hash'] = frame_hash
+
+    @staticmethod
+    def _follow_faces(small, track):
+        """Locate each tracked face near its last position, or None if any is lost"""
+        img_h, img_w = small.shape[:2]
+        faces = []
+        for (x, y, w, h), template in zip(track['rects'], track['templates']):
+            t_h, t_w = template.shape[:2]
+            if t_h < 8 or t_w < 8:
+                return None
+            # Search a window one template-size larger on each side
+            x0 = max(0, int(x * TRACK_SCALE) - t_w); y0 = max(0, int(y * TRACK_SCALE) - t_h)
+            x1 = min(img_w, int(x * TRACK_SCALE) + 2 * t_w); y1 = min(img_h, int(y * TRACK_SCALE) + 2 * t_h)
+            window = small[y0:y1, x0:x1]
+            if window.shape[0] < t_h or window.shape[1] < t_w:
+                return None
+            
+            res = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (loc_x, loc_y) = cv2.minMaxLoc(res)
+            if score < TRACK_MIN_SCORE:
+                return None
+            faces.append((int((x0 + loc_x) / TRACK_SCALE), int((y0 + loc_y) / TRACK_SCALE), w, h))
+        return faces
+
     def detect_faces(self, image, preprocess=True):
         """
         Detect faces using OpenCV DNN SSD
@@ -102,53 +565,84 @@ class FaceRecognizer:
             return []
             
         (h, w) = image.shape[:2]
-        
-        # Resize to 300x300 for SSD
-        blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0,
-            (300, 300), (104.0, 177.0, 123.0))
+        blob = self._ssd_blob(image)[None]
             
-        self.detector.setInput(blob)
-        detections = self.detector.forward()
+        with self._lock:
+            self.detector.setInput(blob)
+            detections = self.detector.forward()
         
-        faces = []
-        
-        # Debugging: Track max confidence
-        max_conf = 0.0
-        
-        # Loop over detections
-        for i in range(0, detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-            if confidence > max_conf: max_conf = confidence
-            
-            if confidence > FACE_DETECTION_THRESHOLD:
-                # Compute (x, y, w, h)
-                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                (startX, startY, endX, endY) = box.astype("int")
-                
-                # CAST TO INT FOR JSON SERIALIZATION
-                startX, startY, endX, endY = int(startX), int(startY), int(endX), int(endY)
-                
-                width = int(endX - startX)
-                height = int(endY - startY)
-                
-                # Check min size
-                if width < FACE_MIN_SIZE[0] or height < FACE_MIN_SIZE[1]:
-                    continue
-                    
-                faces.append((startX, startY, width, height))
+        # (200, 7) rows of [image_id, label, confidence, x1, y1, x2, y2] (box normalized)
+        det = detections[0, 0]
+        faces = self._faces_from_detections(det, w, h)
         
         if not faces:
+            conf = det[:, 2]
+            max_conf = float(conf.max()) if len(conf) else 0.0
             logger.info(f"No faces detected. Max conf: {max_conf:.3f} (Img: {w}x{h})")
                 
         return faces
 
-    def encode_face(self, image, face_rect):
+    def detect_faces_batch(self, images):
         """
-        Generate 128d embedding using SFace
+        Detect faces in several images with one SSD forward pass
+        Worth it on a GPU backend, where one launch replaces len(images).
+        Returns a list of (x, y, w, h) lists, one per image.
         """
-        if self.recognizer is None:
-            return None
-            
+        if self.detector is None or not len(images):
+            return [[] for _ in images]
+        
+        blob = np.stack([self._ssd_blob(image) for image in images])
+        with self._lock:
+            self.detector.setInput(blob)
+            detections = self.detector.forward()
+        
+        # Rows for every image come back together, tagged by image_id
+        det = detections[0, 0]
+        image_ids = det[:, 0].astype(np.int64)
+        return [
+            self._faces_from_detections(det[image_ids == i], image.shape[1], image.shape[0])
+            for i, image in enumerate(images)
+        ]
+
+    @staticmethod
+    def _ssd_blob(image):
+        """
+        Resize straight to 300x300 for SSD (bilinear downscaling only reads
+        the pixels it samples, so an intermediate downscale costs more),
+        subtract the mean and lay out as CHW. SSD boxes are normalized,
+        so they map back onto the full-resolution frame for cropping.
+        """
+        (h, w) = image.shape[:2]
+        if (w, h) != SSD_INPUT_SIZE:
+            image_small = cv2.resize(image, SSD_INPUT_SIZE)
+        else:
+            image_small = image
+        resized = image_small.astype(np.float32)
+        resized -= SSD_MEAN
+        return np.ascontiguousarray(resized.transpose(2, 0, 1))
+
+    @staticmethod
+    def _faces_from_detections(det, w, h):
+        """Confident, large-enough (x, y, w, h) boxes from SSD detection rows"""
+        # Filter all detections at once
+        conf = det[:, 2]
+        
+        # Compute (x, y, w, h) for confident boxes
+        boxes = (det[conf > FACE_DETECTION_THRESHOLD, 3:7] * np.array([w, h, w, h])).astype(np.int64)
+        widths = boxes[:, 2] - boxes[:, 0]
+        heights = boxes[:, 3] - boxes[:, 1]
+        
+        # Check min size
+        size_ok = (widths >= FACE_MIN_SIZE[0]) & (heights >= FACE_MIN_SIZE[1])
+        
+        # tolist() gives plain ints for JSON serialization
+        return list(zip(
+            boxes[size_ok, 0].tolist(), boxes[size_ok, 1].tolist(),
+            widths[size_ok].tolist(), heights[size_ok].tolist()
+        ))
+
+    def _crop_face(self, image, face_rect):
+        """Clamp face_rect to the image bounds and return the ROI (or None)"""
         (x, y, w, h) = face_rect
         (img_h, img_w) = image.shape[:2]
         
@@ -158,75 +652,117 @@ class FaceRecognizer:
         
         face_roi = image[y:y+h, x:x+w]
         if face_roi.size == 0: return None
+        return face_roi
+
+    def encode_faces(self, image, face_rects):
+        """
+        Generate SFace embeddings for several faces with one forward pass
+        Returns (embeddings, rects): an (N, 128) float32 array of unit vectors
+        and the rects that produced a usable crop, in the same order.
+        """
+        if self.recognizer is None:
+            return None, []
         
-        # SFace Preprocessing: 112x112
-        # blobFromImage performs mean subtraction and scaling
-        # SFace expects BGR, 112x112
-        faceBlob = cv2.dnn.blobFromImage(face_roi, 1.0, (112, 112), (0, 0, 0), swapRB=False)
-            
-        self.recognizer.setInput(faceBlob)
-        vec = self.recognizer.forward()
+        rois = []
+        rects = []
+        for rect in face_rects:
+            face_roi = self._crop_face(image, rect)
+            if face_roi is not None:
+                rois.append(cv2.resize(face_roi, SFACE_INPUT_SIZE))
+                rects.append(rect)
         
-        # Normalize vector for Cosine Similarity
-        # SFace output is usually 128d
-        norm_vec = vec / np.linalg.norm(vec)
+        if not rois:
+            return None, []
         
-        return {
-            'encoding': norm_vec.flatten().tolist(),
-            'version': 'opencv_sface_v1'
-        }
+        return self._embed(rois), rects
 
-    def recognize_faces(self, image):
+    def encode_face_batch(self, images, face_rects):
+        """
+        Encode one face per image, (images[i], face_rects[i]), in one forward pass
+        Returns a list with the packed bytes (as encode_face) or None for
+        each pair.
+        """
+        if self.recognizer is None:
+            return [None] * len(images)
+        
+        rois = []
+        positions = []
+        for i, (image, rect) in enumerate(zip(images, face_rects)):
+            face_roi = self._crop_face(image, rect)
+            if face_roi is not None:
+                rois.append(cv2.resize(face_roi, SFACE_INPUT_SIZE))
+                positions.append(i)
+        
+        packed = [None] * len(images)
+        if rois:
+            for i, emb in zip(positions, self._embed(rois)):
+                packed[i] = pack_encoding(emb)
+        return packed
+
+    def _embed(self, rois):
+        """Unit SFace embeddings, shape (N, 128), for a list of 112x112 BGR crops"""
+        # SFace Preprocessing: 112x112, BGR, no mean subtraction -> NCHW float32
+        faceBlob = np.ascontiguousarray(np.stack(rois).transpose(0, 3, 1, 2), dtype=np.float32)
+        
+        with self._lock:
+            self.recognizer.setInput(faceBlob)
+            embs = self.recognizer.forward().reshape(len(rois), -1).astype(np.float32, copy=False)
+        
+        # Normalize rows for Cosine Similarity (row-wise dot, no linalg.norm overhead)
+        embs *= (1.0 / np.sqrt(np.einsum('ij,ij->i', embs, embs)))[:, None]
+        return embs
+
+    def encode_face(self, image, face_rect):
+        """
+        Generate 128d embedding using SFace
+        Returns the packed bytes for FaceEncoding.encoding_data, or None
+        """
+        embs, _ = self.encode_faces(image, [face_rect])
+        if embs is None:
+            return None
+        
+        # Ready to store in FaceEncoding.encoding_data
+        return pack_encoding(embs[0])
+
+    def recognize_faces(self, image, faces=None, class_key=None):
         """
         Recognize faces using Cosine Similarity on SFace embeddings
+        Pass `faces` (from detect_faces/verify_face_quality) to skip a
+        second SSD pass over the same image, and `class_key`
+        ((class_year, division_id)) to only match that class's students.
         """
-        faces = self.detect_faces(image)
+        # One consistent gallery for the whole call
+        if class_key is not None:
+            gallery = self.class_gallery(*class_key) + (None,)
+        else:
+            gallery = self._gallery_snapshot()
+        known_face_ids = gallery[3]
+        if not known_face_ids:
+            return [] # No training data
+        
+        if faces is None:
+            faces = self.detect_faces(image)
         results = []
         
         if not faces:
             return []
             
-        if not self.known_face_encodings:
-            return [] # No training data
-            
-        known_encs = np.array(self.known_face_encodings) # Shape: (N, 128)
-            
-        for (x, y, w, h) in faces:
-            # Encode
-            encoding_data = self.encode_face(image, (x, y, w, h))
-            if not encoding_data:
-                continue
-                
-            input_vec = np.array(encoding_data['encoding']) # Shape: (128,)
-            
-            # Compute Cosine Similarity
-            # Similarity = (A . B) / (||A|| * ||B||)
-            # Since vectors are already normalized: Similarity = A . B
-            
-            # Dot product against all known encodings
-            scores = np.dot(known_encs, input_vec) # Shape: (N,)
-            
-            best_idx = np.argmax(scores)
-            max_score = scores[best_idx]
-            
-            student_id = None
-            confidence = 0.0
-            
-            if max_score > FACE_MATCH_THRESHOLD:
-                student_id = self.known_face_ids[best_idx]
-                # Scale confidence: Threshold -> 50%, 1.0 -> 100%
-                # (score - thresh) / (1 - thresh)
-                norm_score = (max_score - FACE_MATCH_THRESHOLD) / (1.0 - FACE_MATCH_THRESHOLD)
-                confidence = 50 + (norm_score * 50)
-                confidence = min(100, max(0, confidence))
-            else:
-                 # Scale confidence: 0 -> 0%, Threshold -> 50%
-                 confidence = (max_score / FACE_MATCH_THRESHOLD) * 50
+        # Encode every face in a single forward pass
+        embs, rects = self.encode_faces(image, faces) # Shape: (F, 128)
+        if embs is None:
+            return []
+        
+        # Confidence: 0 -> 0%, threshold -> 50%, 1.0 -> 100%
+        best_idxs, best_scores, confidences = self._best_matches(embs, gallery)
+        
+        for (x, y, w, h), best_idx, max_score, confidence in zip(
+                rects, best_idxs.tolist(), best_scores.tolist(), confidences.tolist()):
+            student_id = known_face_ids[best_idx] if best_idx >= 0 else None
             
             results.append({
                 'rect': (x, y, w, h),
                 'student_id': student_id,
-                'confidence': round(confidence, 1),
+                'confidence': round(float(confidence), 1),
                 'score': round(float(max_score), 3),
                 'distance': round(float(1.0 - max_score), 3) # for backward compat
             })
@@ -256,13 +792,18 @@ class FaceRecognizer:
         cv2.imwrite(filepath, image[y1:y2, x1:x2])
         return os.path.join('faces', f'student_{student_id}', filename)
 
+    @staticmethod
+    def bytes_to_image(img_data):
+        """Decode encoded image bytes (JPEG/PNG) to a BGR array, or None"""
+        nparr = np.frombuffer(img_data, np.uint8)
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
     @staticmethod
     def base64_to_image(base64_string):
         if ',' in base64_string:
             base64_string = base64_string.split(',')[1]
         img_data = base64.b64decode(base64_string)
-        nparr = np.frombuffer(img_data, np.uint8)
-        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        return FaceRecognizer.bytes_to_image(img_data)
 
 # Global Instance
 face_recognizer = FaceRecognizer()
@@ -60,7 +60,7 @@ def save_face_encoding(request):
             # Save to database
             FaceEncoding.objects.create(
                 student=student,
-                encoding_data=json.dumps(encoding),
+                encoding_data=encoding,
                 image_path=image_path,
                 is_active=True
             )
@@ -72,8 +72,8 @@ def save_face_encoding(request):
                 student.photo = image_path
             student.save()
             
-            # Refresh in-memory cache so new student is recognizable immediately
-            face_recognizer.refresh_encodings()
+            # Add to the in-memory cache so new student is recognizable immediately
+            face_recognizer.add_encoding(student_id, encoding)
             
             return JsonResponse({
                 'success': True,
@@ -1,4 +1,6 @@
 from django import forms
+from django.core.cache import cache
+
 from .models import Faculty, SystemSettings, Student, Department, Division, Subject, LecturePeriod, AttendanceSession
 
 class FacultyForm(forms.ModelForm):
@@ -76,6 +78,15 @@ class StudentForm(forms.ModelForm):
         return student_id
 
 
+# Select options for the start-session form, invalidated on save/delete
+DROPDOWN_CACHE_KEYS = {
+    'division': 'rv:dropdown:divisions',
+    'subject': 'rv:dropdown:subjects',
+    'lecture_period': 'rv:dropdown:lecture_periods',
+}
+DROPDOWN_CACHE_TIMEOUT = 300
+
+
 class AttendanceSessionForm(forms.Form):
     """Form for starting an attendance session"""
     class_year = forms.ChoiceField(
@@ -111,6 +122,19 @@ class AttendanceSessionForm(forms.Form):
         })
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Render the selects from cached (pk, label) pairs; the querysets
+        # are still used to validate the submitted pks
+        for name, key in DROPDOWN_CACHE_KEYS.items():
+            field = self.fields[name]
+            options = cache.get_or_set(
+                key,
+                lambda field=field: [(obj.pk, field.label_from_instance(obj)) for obj in field.queryset],
+                DROPDOWN_CACHE_TIMEOUT
+            )
+            field.choices = [('', field.empty_label)] + options
+
 
 class SettingsForm(forms.ModelForm):
     class Meta:
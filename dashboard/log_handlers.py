@@ -0,0 +1,64 @@
+"""
+Logging handlers for RollVision
+"""
+import logging
+import time
+from logging.handlers import RotatingFileHandler
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that batches formatted records in memory and writes
+    them with a single call once `capacity` records are queued or
+    `flush_interval` seconds have passed (checked as records arrive).
+    Records at `flush_level` or above flush straight away, like
+    MemoryHandler's flushLevel, so an error is on disk even if the process
+    is killed before another record or atexit comes along. Anything still
+    buffered is written on flush()/close(), which logging.shutdown() calls
+    at exit.
+    """
+
+    def __init__(self, filename, capacity=64, flush_interval=5.0, flush_level=logging.ERROR, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self.buffer = []
+        self._last_flush = time.monotonic()
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+
+        if (record.levelno >= self.flush_level
+                or len(self.buffer) >= self.capacity
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                data = ''.join(self.buffer)
+                self.buffer = []
+
+                if self.stream is None:
+                    self.stream = self._open()
+                # Roll over once per batch instead of once per record
+                if self.maxBytes > 0 and self.stream.tell() and self.stream.tell() + len(data) >= self.maxBytes:
+                    self.doRollover()
+                    if self.stream is None:
+                        self.stream = self._open()
+
+                self.stream.write(data)
+            self._last_flush = time.monotonic()
+            super().flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
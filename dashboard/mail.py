@@ -0,0 +1,79 @@
+"""
+Email backends for RollVision
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+logger = logging.getLogger(__name__)
+
+_mail_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+_STOP = object()
+
+
+def _drain():
+    """Send queued messages over one connection per batch"""
+    while True:
+        item = _mail_queue.get()
+        if item is _STOP:
+            return
+
+        batch = list(item)
+        stop = False
+        while True:
+            try:
+                item = _mail_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.extend(item)
+
+        try:
+            connection = get_connection(settings.EMAIL_QUEUE_BACKEND, fail_silently=False)
+            sent = connection.send_messages(batch)
+            logger.info("Sent %s/%s queued email(s)", sent, len(batch))
+        except Exception:
+            logger.exception("Failed to send %s queued email(s)", len(batch))
+
+        if stop:
+            return
+
+
+def _stop_worker():
+    _mail_queue.put(_STOP)
+    _worker.join(timeout=30)
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_drain, name='mail-queue', daemon=True)
+            _worker.start()
+            atexit.register(_stop_worker)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Hand messages to a background thread and return immediately so views
+    don't wait on the SMTP handshake. The thread delivers them through
+    settings.EMAIL_QUEUE_BACKEND; failures are logged rather than raised.
+    """
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        _ensure_worker()
+        _mail_queue.put(list(email_messages))
+        return len(email_messages)
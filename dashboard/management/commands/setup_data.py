@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from dashboard.models import Department, Division, Subject, LecturePeriod
 from datetime import time
 
@@ -6,6 +7,25 @@ from datetime import time
 class Command(BaseCommand):
     help = 'Setup initial data for RollVision (Departments, Divisions, Subjects, Lecture Periods)'
 
+    def create_missing(self, model, field, objects, label=''):
+        """
+        Insert the objects whose unique `field` isn't in the table yet
+        One SELECT for the existing rows and one multi-row INSERT, instead
+        of a get_or_create round-trip per row.
+        """
+        existing = model.objects.in_bulk([getattr(obj, field) for obj in objects], field_name=field)
+        model.objects.bulk_create(
+            [obj for obj in objects if getattr(obj, field) not in existing],
+            ignore_conflicts=True
+        )
+        for obj in objects:
+            current = existing.get(getattr(obj, field))
+            if current is None:
+                self.stdout.write(self.style.SUCCESS(f"   ✓ Created: {label}{obj}"))
+            else:
+                self.stdout.write(f"   - Already exists: {label}{current}")
+
+    @transaction.atomic
     def handle(self, *args, **options):
         self.stdout.write("=" * 60)
         self.stdout.write(self.style.SUCCESS("Setting up initial data for RollVision..."))
@@ -19,15 +39,7 @@ class Command(BaseCommand):
             {"code": "ME", "name": "Mechanical", "description": "Mechanical Engineering"},
         ]
 
-        for dept_data in departments:
-            dept, created = Department.objects.get_or_create(
-                code=dept_data["code"],
-                defaults={"name": dept_data["name"], "description": dept_data["description"]}
-            )
-            if created:
-                self.stdout.write(self.style.SUCCESS(f"   ✓ Created: {dept}"))
-            else:
-                self.stdout.write(f"   - Already exists: {dept}")
+        self.create_missing(Department, 'code', [Department(**dept_data) for dept_data in departments])
 
         # Create Divisions
         self.stdout.write("\n2. Creating Divisions...")
@@ -37,15 +49,7 @@ class Command(BaseCommand):
             {"name": "C", "max_students": 60},
         ]
 
-        for div_data in divisions:
-            div, created = Division.objects.get_or_create(
-                name=div_data["name"],
-                defaults={"max_students": div_data["max_students"]}
-            )
-            if created:
-                self.stdout.write(self.style.SUCCESS(f"   ✓ Created: Division {div}"))
-            else:
-                self.stdout.write(f"   - Already exists: Division {div}")
+        self.create_missing(Division, 'name', [Division(**div_data) for div_data in divisions], label='Division ')
 
         # Create Subjects
         self.stdout.write("\n3. Creating Subjects...")
@@ -58,20 +62,7 @@ class Command(BaseCommand):
             {"code": "CS402", "name": "Software Engineering", "department": cs_dept, "semester": 4, "credits": 3},
         ]
 
-        for subj_data in subjects:
-            subj, created = Subject.objects.get_or_create(
-                code=subj_data["code"],
-                defaults={
-                    "name": subj_data["name"],
-                    "department": subj_data["department"],
-                    "semester": subj_data["semester"],
-                    "credits": subj_data["credits"]
-                }
-            )
-            if created:
-                self.stdout.write(self.style.SUCCESS(f"   ✓ Created: {subj}"))
-            else:
-                self.stdout.write(f"   - Already exists: {subj}")
+        self.create_missing(Subject, 'code', [Subject(**subj_data) for subj_data in subjects])
 
         # Create Lecture Periods
         self.stdout.write("\n4. Creating Lecture Periods...")
@@ -85,20 +76,16 @@ class Command(BaseCommand):
             {"number": 7, "name": "Lab Session 1", "start": time(15, 0), "end": time(17, 0)},
         ]
 
-        for period_data in periods:
-            period, created = LecturePeriod.objects.get_or_create(
+        self.create_missing(LecturePeriod, 'period_number', [
+            LecturePeriod(
                 period_number=period_data["number"],
-                defaults={
-                    "name": period_data["name"],
-                    "start_time": period_data["start"],
-                    "end_time": period_data["end"],
-                    "is_active": True
-                }
+                name=period_data["name"],
+                start_time=period_data["start"],
+                end_time=period_data["end"],
+                is_active=True
             )
-            if created:
-                self.stdout.write(self.style.SUCCESS(f"   ✓ Created: {period}"))
-            else:
-                self.stdout.write(f"   - Already exists: {period}")
+            for period_data in periods
+        ])
 
         self.stdout.write("\n" + "=" * 60)
         self.stdout.write(self.style.SUCCESS("✓ Initial data setup complete!"))
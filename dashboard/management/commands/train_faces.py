@@ -1,8 +1,15 @@
 from django.core.management.base import BaseCommand
 from dashboard.models import Student, FaceEncoding
 from dashboard.face_utils import face_recognizer
+from django.db import connections, transaction
+from django.db.models import Prefetch
+from django.db.models.functions import Length
+from django.utils import timezone
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from PIL import Image, ImageOps
 import cv2
-import json
+import numpy as np
 import os
 import logging
 from django.conf import settings
@@ -10,84 +17,302 @@ from django.conf import settings
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Photos are decoded at roughly this size; the SSD detector sees 300x300
+# and SFace 112x112, so full-resolution camera photos are wasted work
+DECODE_SIZE = (800, 800)
+# Box-reduce anything draft mode couldn't shrink (PNGs) to about this shortest side
+MIN_SIDE = 600
+# Students are streamed, encoded and saved this many at a time
+STUDENT_CHUNK_SIZE = 200
+
+def _cache_path(image_path):
+    """Where the decoded copy of a photo is cached, keyed by the photo's path"""
+    digest = hashlib.sha1(os.path.abspath(image_path).encode()).hexdigest()[:20]
+    return os.path.join(settings.MEDIA_ROOT, 'faces', 'cache', f'{digest}.npy')
+
+def _load_image(image_path):
+    """
+    Student photo as a BGR array, or None if it can't be read
+    Decoded (and downscaled) photos are cached as .npy files, so re-runs
+    skip JPEG decoding for photos that haven't changed since.
+    """
+    cache_path = _cache_path(image_path)
+    try:
+        if os.path.getmtime(cache_path) > os.path.getmtime(image_path):
+            return np.load(cache_path)
+    except (OSError, ValueError):
+        pass  # No cache yet, or unreadable: decode the photo
+    
+    image = _decode_image(image_path)
+    if image is not None:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # Write then rename, so a parallel worker never loads half a file
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, image)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not cache {image_path}: {e}")
+    return image
+
+def _decode_image(image_path):
+    """
+    Decode a student photo as a BGR array, or None if it can't be read
+    For JPEGs, PIL's draft mode has libjpeg scale by 1/2-1/8 in the DCT
+    domain, so a 12 MP photo is never decoded at full size. Other formats
+    are box-reduced by an integer factor so the color conversion and face
+    crops work on a small image too.
+    """
+    try:
+        with Image.open(image_path) as pil:
+            pil.draft('RGB', DECODE_SIZE)
+            # Handle EXIF rotation (iPhone/Android photos), as cv2.imread did
+            pil = ImageOps.exif_transpose(pil)
+            factor = min(pil.size) // MIN_SIDE
+            if factor > 1:
+                pil = pil.reduce(factor)
+            rgb = np.asarray(pil.convert('RGB'))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not decode {image_path}: {e}")
+        return None
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+def _init_worker():
+    """
+    ProcessPoolExecutor initializer
+    face_recognizer is the module-level singleton, so each worker loads its
+    nets here exactly once and reuses them for every photo; they are never
+    rebuilt per call. A warm-up forward keeps the first job from stalling,
+    and one OpenCV thread per worker leaves the cores to the pool.
+    """
+    face_recognizer.load_models(num_threads=1)
+    if face_recognizer.detector is not None:
+        face_recognizer.warm_up()
+
+def _encode_one(job):
+    """
+    Load, detect and encode one student photo
+    Takes (student pk, image path) and returns (student pk, image path,
+    encoding bytes, error message); runs in a worker process, so it only
+    uses the image and the module-level face_recognizer, never the DB.
+    """
+    student_pk, image_path = job
+    try:
+        image = _load_image(image_path)
+        if image is None:
+            return student_pk, image_path, None, "Could not read image"
+        
+        # Detect and Encode
+        # Use the SSD detector (default in `detect_faces`)
+        faces = face_recognizer.detect_faces(image)
+        if not faces:
+            return student_pk, image_path, None, "No face detected in image"
+        
+        # Take largest face
+        largest_face = max(faces, key=lambda r: r[2] * r[3])
+        
+        # Generate Encoding
+        encoding_data = face_recognizer.encode_face(image, largest_face)
+        if not encoding_data:
+            return student_pk, image_path, None, "Could not encode face"
+        return student_pk, image_path, encoding_data, None
+    except Exception as e:
+        return student_pk, image_path, None, f"Error: {e}"
+
+def _encode_batch(jobs):
+    """
+    Batched _encode_one: one SSD forward and one SFace forward for all jobs
+    Meant for GPU backends (settings.FACE_DNN_BACKEND = 'cuda'), where
+    one launch per batch beats one per photo. Returns the same tuples as
+    _encode_one, in job order.
+    """
+    results = {}
+    images = {}
+    for student_pk, image_path in jobs:
+        image = _load_image(image_path)
+        if image is None:
+            results[student_pk] = (student_pk, image_path, None, "Could not read image")
+        else:
+            images[student_pk] = image
+    
+    # SSD resizes every image to 300x300, so differently sized photos batch fine
+    pks = list(images)
+    faces_per_image = face_recognizer.detect_faces_batch([images[pk] for pk in pks])
+    
+    to_encode = []
+    for pk, faces in zip(pks, faces_per_image):
+        if faces:
+            # Take largest face
+            to_encode.append((pk, max(faces, key=lambda r: r[2] * r[3])))
+    
+    encodings = face_recognizer.encode_face_batch(
+        [images[pk] for pk, _ in to_encode], [rect for _, rect in to_encode]
+    ) if to_encode else []
+    encoded = {pk: data for (pk, _), data in zip(to_encode, encodings)}
+    
+    for student_pk, image_path in jobs:
+        if student_pk in results:
+            continue
+        if student_pk not in encoded:
+            results[student_pk] = (student_pk, image_path, None, "No face detected in image")
+        elif not encoded[student_pk]:
+            results[student_pk] = (student_pk, image_path, None, "Could not encode face")
+        else:
+            results[student_pk] = (student_pk, image_path, encoded[student_pk], None)
+    return [results[student_pk] for student_pk, _ in jobs]
+
 class Command(BaseCommand):
     help = 'Regenerates 128d OpenFace/Dlib encodings for all students from their photos'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-encode students whose active encoding already comes from the same image',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Processes to encode photos with (default: one per CPU core)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=0,
+            help='Detect and encode this many photos per forward pass in one process (for GPU backends)',
+        )
+
     def handle(self, *args, **kwargs):
         self.stdout.write("Starting Deep Learning Encoding Regeneration...")
+        force = kwargs.get('force', False)
+        workers = kwargs.get('workers') or os.cpu_count() or 1
+        batch_size = kwargs.get('batch_size') or 0
+        
+        total = Student.objects.count()
         
-        students = Student.objects.all()
+        # Stream students (and, per chunk, their encodings); the dedup check
+        # only needs each blob's size, so leave the blobs in the DB
+        encodings = FaceEncoding.objects.defer('encoding_data').annotate(encoding_size=Length('encoding_data'))
+        students = (
+            Student.objects.only('id', 'student_id', 'photo', 'is_trained')
+            .prefetch_related(Prefetch('face_encodings', queryset=encodings))
+            .iterator(chunk_size=STUDENT_CHUNK_SIZE)
+        )
         # Optionally clear old encodings if you want a fresh start
         # FaceEncoding.objects.all().delete()
         
-        count = 0
-        success_count = 0
+        # Each photo is independent, so spread them over processes. The GPU
+        # (--batch-size) is shared, so batches run in this process instead.
+        executor = None
+        if batch_size <= 0 and workers > 1 and total > 1:
+            # Workers don't touch the DB; fork them now, before the student
+            # cursor is open, so they don't inherit this process's connection
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            executor.submit(int).result()
         
-        for s in students:
-            self.stdout.write(f"Processing {s.student_id}...")
-            
-            # Find the best image
-            image_path = None
-            
-            # 1. Try Main Photo
-            if s.photo and os.path.exists(s.photo.path):
-                image_path = s.photo.path
-            
-            # 2. Try Faces Directory if main photo missing
-            if not image_path:
-                faces_dir = os.path.join(settings.MEDIA_ROOT, 'faces', f'student_{s.student_id}')
-                if os.path.exists(faces_dir):
-                    images = [f for f in os.listdir(faces_dir) if f.lower().endswith(('jpg', 'png'))]
-                    if images:
-                        image_path = os.path.join(faces_dir, images[0])
-            
-            if not image_path:
-                self.stdout.write(self.style.WARNING(f"  - No image found for {s.student_id}"))
-                continue
-                
-            # Process Image
-            try:
-                # Check if encoding already exists to save time (optional)
-                # if FaceEncoding.objects.filter(student=s).exists():
-                #     self.stdout.write(f"  - Encoding already exists.")
-                #     continue
-
-                image = cv2.imread(image_path)
-                if image is None:
-                    continue
+        success_count = 0
+        try:
+            # Pick an image per student; the CV work is queued as jobs and
+            # run (and saved) a chunk at a time
+            jobs = []
+            pending = {}
+            for s in students:
+                self.stdout.write(f"Processing {s.student_id}...")
                 
-                # Detect and Encode
-                # Use Dlib HOG (default in `detect_faces`)
-                faces = face_recognizer.detect_faces(image)
+                # Find the best image
+                image_path = None
                 
-                if not faces:
-                    self.stdout.write(self.style.WARNING(f"  - No face detected in image for {s.student_id}"))
-                    continue
+                # 1. Try Main Photo
+                if s.photo and os.path.exists(s.photo.path):
+                    image_path = s.photo.path
                 
-                # Take largest face
-                largest_face = max(faces, key=lambda r: r[2] * r[3])
+                # 2. Try Faces Directory if main photo missing
+                if not image_path:
+                    faces_dir = os.path.join(settings.MEDIA_ROOT, 'faces', f'student_{s.student_id}')
+                    if os.path.exists(faces_dir):
+                        images = [f for f in os.listdir(faces_dir) if f.lower().endswith(('jpg', 'png'))]
+                        if images:
+                            image_path = os.path.join(faces_dir, images[0])
                 
-                # Generate Encoding
-                encoding_data = face_recognizer.encode_face(image, largest_face)
+                if not image_path:
+                    self.stdout.write(self.style.WARNING(f"  - No image found for {s.student_id}"))
+                    continue
                 
-                if encoding_data:
-                    # Save/Update Encoding
-                    FaceEncoding.objects.update_or_create(
-                        student=s,
-                        defaults={
-                            'encoding_data': json.dumps(encoding_data),
-                            'image_path': image_path,
-                            'is_active': True
-                        }
-                    )
-                    s.is_trained = True
-                    s.save()
+                # Skip students already encoded from this image (prefetched, no query)
+                if not force and any(
+                    e.is_active and e.image_path == image_path and e.encoding_size > 1
+                    for e in s.face_encodings.all()
+                ):
+                    self.stdout.write(f"  - Encoding already exists.")
                     success_count += 1
-                    self.stdout.write(self.style.SUCCESS(f"  + encoded successfully"))
+                    continue
+                
+                jobs.append((s.id, image_path))
+                pending[s.id] = s
                 
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"  ! Error: {e}"))
+                if len(jobs) == STUDENT_CHUNK_SIZE:
+                    success_count += self.encode_and_save(jobs, pending, executor, batch_size)
+                    jobs = []
+                    pending = {}
+            
+            if jobs:
+                success_count += self.encode_and_save(jobs, pending, executor, batch_size)
+        finally:
+            if executor is not None:
+                executor.shutdown()
         
         # Reload cache
         face_recognizer.refresh_encodings()
-        self.stdout.write(self.style.SUCCESS(f"\nCompleted. Generated encodings for {success_count}/{len(students)} students."))
+        self.stdout.write(self.style.SUCCESS(f"\nCompleted. Generated encodings for {success_count}/{total} students."))
+
+    def encode_and_save(self, jobs, pending, executor, batch_size):
+        """
+        Encode one chunk of (student pk, image path) jobs and write the
+        results in a handful of queries. Returns the number of students encoded.
+        """
+        # Decode, detect and encode
+        if batch_size > 0:
+            results = []
+            for start in range(0, len(jobs), batch_size):
+                results.extend(_encode_batch(jobs[start:start + batch_size]))
+        elif executor is not None and len(jobs) > 1:
+            results = executor.map(_encode_one, jobs, chunksize=8)
+        else:
+            results = map(_encode_one, jobs)
+        
+        to_create = []
+        to_update = []
+        to_train = []
+        for student_pk, image_path, encoding_data, error in results:
+            s = pending[student_pk]
+            if error:
+                self.stdout.write(self.style.WARNING(f"  - {s.student_id}: {error}"))
+                continue
+            
+            # Update the student's latest encoding, or queue a new one
+            existing = s.face_encodings.all()
+            if existing:
+                encoding = existing[0]
+                encoding.encoding_data = encoding_data
+                encoding.image_path = image_path
+                encoding.is_active = True
+                to_update.append(encoding)
+            else:
+                to_create.append(FaceEncoding(
+                    student=s,
+                    encoding_data=encoding_data,
+                    image_path=image_path,
+                    is_active=True
+                ))
+            to_train.append(s.id)
+            self.stdout.write(self.style.SUCCESS(f"  + {s.student_id} encoded successfully"))
+        
+        # Persist the chunk in a handful of queries
+        with transaction.atomic():
+            FaceEncoding.objects.bulk_create(to_create)
+            FaceEncoding.objects.bulk_update(to_update, ['encoding_data', 'image_path', 'is_active'])
+            Student.objects.filter(id__in=to_train).update(is_trained=True, updated_at=timezone.now())
+        return len(to_train)
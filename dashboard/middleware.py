@@ -3,12 +3,24 @@ Custom middleware for RollVision security and monitoring
 """
 import time
 import logging
+from django.conf import settings
 from django.core.cache import cache
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 
+from .utils import get_client_ip
+
+try:
+    from django_redis import get_redis_connection  # Optional: pipelined counters
+    from redis.exceptions import RedisError
+except ImportError:
+    get_redis_connection = None
+
 logger = logging.getLogger(__name__)
 
+# Paths that skip rate limiting (str.startswith takes the whole tuple)
+SKIP_RATE_LIMIT_PREFIXES = ('/static/', '/media/', '/admin/')
+
 
 class RateLimitMiddleware(MiddlewareMixin):
     """
@@ -21,17 +33,32 @@ class RateLimitMiddleware(MiddlewareMixin):
         '/api/save-face/': {'calls': 20, 'period': 60},  # Increased for easier registration
         '/api/process-attendance/': {'calls': 20, 'period': 60},  # Legacy endpoint
         '/api/auto-mark-attendance/': {'calls': 2000, 'period': 60},  # High limit for live 30fps detection
+        '/api/task-status/': {'calls': 2000, 'period': 60},  # Polled while async recognition runs
         'default': {'calls': 200, 'period': 60}  # General limit
     }
     
+    # Endpoint prefixes, longest first so the most specific one wins
+    SORTED_LIMITS = tuple(sorted(
+        ((endpoint, limit) for endpoint, limit in RATE_LIMITS.items() if endpoint != 'default'),
+        key=lambda item: -len(item[0])
+    ))
+    DEFAULT_LIMIT = RATE_LIMITS['default']
+    
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.redis_pipeline = (
+            get_redis_connection is not None
+            and settings.CACHES['default']['BACKEND'].startswith('django_redis.')
+        )
+    
     def process_request(self, request):
         """Check rate limit before processing request"""
         # Skip rate limiting for static files and admin
-        if request.path.startswith('/static/') or request.path.startswith('/media/') or request.path.startswith('/admin/'):
+        if request.path.startswith(SKIP_RATE_LIMIT_PREFIXES):
             return None
         
         # Get client IP address
-        ip_address = self.get_client_ip(request)
+        ip_address = get_client_ip(request)
         
         # Determine rate limit for this endpoint
         rate_limit = self.get_rate_limit(request.path)
@@ -39,36 +66,80 @@ class RateLimitMiddleware(MiddlewareMixin):
         # Create cache key
         cache_key = f"rate_limit:{ip_address}:{request.path}"
         
-        # Get current request count
-        request_count = cache.get(cache_key, 0)
+        period = rate_limit['period']
+        request_count = self.count_request(cache_key, period, rate_limit['calls'])
         
-        if request_count >= rate_limit['calls']:
-            logger.warning(f"Rate limit exceeded for IP {ip_address} on {request.path}")
+        # None when the cache is down (IGNORE_EXCEPTIONS); fail open
+        if request_count is not None and request_count > rate_limit['calls']:
+            logger.warning("Rate limit exceeded for IP %s on %s", ip_address, request.path)
             return JsonResponse({
                 'error': 'Rate limit exceeded. Please try again later.',
-                'retry_after': rate_limit['period']
+                'retry_after': period
             }, status=429)
         
-        # Increment request count
-        cache.set(cache_key, request_count + 1, rate_limit['period'])
-        
         return None
     
-    def get_client_ip(self, request):
-        """Extract client IP address from request"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+    def count_request(self, cache_key, period, calls):
+        """Bump the request counter for cache_key and return its new value"""
+        if self.redis_pipeline:
+            # Create-if-missing and increment in one MULTI/EXEC pipeline so
+            # Redis is hit once per request instead of once per command;
+            # atomic, and INCR keeps the key's expiry
+            try:
+                with get_redis_connection('default').pipeline() as pipe:
+                    key = cache.make_key(cache_key)
+                    pipe.set(key, 0, ex=period, nx=True)
+                    pipe.incr(key)
+                    return pipe.execute()[1]
+            except RedisError:
+                logger.warning("Redis unavailable, skipping rate limit for %s", cache_key)
+                return None
+        
+        # Other backends are approximate: BaseCache.incr (FileBasedCache,
+        # DatabaseCache) is a get+set that can lose concurrent increments
+        # and re-sets the key with the default TIMEOUT. Keying the counter
+        # by window number keeps that from stretching the window, and
+        # requests over the limit stop counting so the next window
+        # unblocks the client
+        window_key = f"{cache_key}:{int(time.time()) // period}"
+        if cache.add(window_key, 1, period):
+            return 1
+        count = cache.get(window_key)
+        if count is None or count > calls:
+            # Expired in between (fail open), or already over the limit
+            return count
+        try:
+            return cache.incr(window_key)
+        except ValueError:
+            return None
     
     def get_rate_limit(self, path):
         """Get rate limit configuration for given path"""
-        for endpoint, limit in self.RATE_LIMITS.items():
-            if endpoint != 'default' and path.startswith(endpoint):
+        for endpoint, limit in self.SORTED_LIMITS:
+            if path.startswith(endpoint):
                 return limit
-        return self.RATE_LIMITS['default']
+        return self.DEFAULT_LIMIT
+
+
+class SessionActivityMiddleware(MiddlewareMixin):
+    """
+    Slide the session expiry without saving the session on every request.
+    The session is only marked modified once REFRESH_INTERVAL seconds have
+    passed since the last recorded activity.
+    """
+    
+    REFRESH_INTERVAL = 300  # seconds
+    
+    def process_request(self, request):
+        """Touch the session at most once per REFRESH_INTERVAL"""
+        session = request.session
+        if session.session_key is None:
+            return None
+        
+        now = int(time.time())
+        if now - session.get('_last_activity', 0) > self.REFRESH_INTERVAL:
+            session['_last_activity'] = now
+        return None
 
 
 class AuditLogMiddleware(MiddlewareMixin):
@@ -77,12 +148,12 @@ class AuditLogMiddleware(MiddlewareMixin):
     """
     
     # Paths that should be audited
-    AUDIT_PATHS = [
+    AUDIT_PATHS = (
         '/api/save-face/',
         '/api/process-attendance/',
         '/faculty/delete/',
         '/settings/',
-    ]
+    )
     
     def process_request(self, request):
         """Log request start time"""
@@ -91,81 +162,72 @@ class AuditLogMiddleware(MiddlewareMixin):
     
     def process_response(self, request, response):
         """Log completed requests for audited endpoints"""
-        # Check if this path should be audited
-        should_audit = any(request.path.startswith(path) for path in self.AUDIT_PATHS)
+        # Check if this path should be audited (and that the line would be logged)
+        should_audit = logger.isEnabledFor(logging.INFO) and request.path.startswith(self.AUDIT_PATHS)
         
         if should_audit:
             duration = time.time() - getattr(request, '_audit_start_time', time.time())
             
             # Get client IP
-            ip_address = self.get_client_ip(request)
+            ip_address = get_client_ip(request)
             
             # Log the audit trail
             logger.info(
-                f"AUDIT: {request.method} {request.path} | "
-                f"IP: {ip_address} | "
-                f"User: {getattr(request.user, 'username', 'anonymous')} | "
-                f"Status: {response.status_code} | "
-                f"Duration: {duration:.2f}s"
+                "AUDIT: %s %s | IP: %s | User: %s | Status: %s | Duration: %.2fs",
+                request.method, request.path, ip_address,
+                getattr(request.user, 'username', 'anonymous'),
+                response.status_code, duration
             )
         
         return response
-    
-    def get_client_ip(self, request):
-        """Extract client IP address from request"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
 
 
 class SecurityHeadersMiddleware(MiddlewareMixin):
     """
     Add security headers to all responses
+    The headers never change after startup, so they are built once when
+    Django instantiates the middleware.
     """
     
-    def process_response(self, request, response):
-        """Add security headers"""
-        from django.conf import settings
-        
-        # Prevent clickjacking
-        response['X-Frame-Options'] = 'DENY'
-        
-        # Prevent MIME type sniffing
-        response['X-Content-Type-Options'] = 'nosniff'
-        
-        # Enable XSS protection
-        response['X-XSS-Protection'] = '1; mode=block'
-        
-       # Referrer policy
-        response['Referrer-Policy'] = 'same-origin'
+    # Directive name -> RollVision/csp.py setting
+    CSP_DIRECTIVES = (
+        ('default-src', 'CSP_DEFAULT_SRC'),
+        ('script-src', 'CSP_SCRIPT_SRC'),
+        ('style-src', 'CSP_STYLE_SRC'),
+        ('font-src', 'CSP_FONT_SRC'),
+        ('img-src', 'CSP_IMG_SRC'),
+        ('media-src', 'CSP_MEDIA_SRC'),
+        ('connect-src', 'CSP_CONNECT_SRC'),
+    )
+    
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.headers = {
+            # Prevent clickjacking
+            'X-Frame-Options': 'DENY',
+            # Prevent MIME type sniffing
+            'X-Content-Type-Options': 'nosniff',
+            # Enable XSS protection
+            'X-XSS-Protection': '1; mode=block',
+            # Referrer policy
+            'Referrer-Policy': 'same-origin',
+            'Content-Security-Policy': self.build_csp(),
+        }
+    
+    @classmethod
+    def build_csp(cls):
+        """Content Security Policy - build from RollVision/csp.py"""
+        from RollVision import csp
         
-        # Content Security Policy - build from settings
         csp_parts = []
-        
-        if hasattr(settings, 'CSP_DEFAULT_SRC'):
-            csp_parts.append(f"default-src {' '.join(settings.CSP_DEFAULT_SRC)}")
-        
-        if hasattr(settings, 'CSP_SCRIPT_SRC'):
-            csp_parts.append(f"script-src {' '.join(settings.CSP_SCRIPT_SRC)}")
-        
-        if hasattr(settings, 'CSP_STYLE_SRC'):
-            csp_parts.append(f"style-src {' '.join(settings.CSP_STYLE_SRC)}")
-        
-        if hasattr(settings, 'CSP_FONT_SRC'):
-            csp_parts.append(f"font-src {' '.join(settings.CSP_FONT_SRC)}")
-        
-        if hasattr(settings, 'CSP_IMG_SRC'):
-            csp_parts.append(f"img-src {' '.join(settings.CSP_IMG_SRC)}")
-        
-        if hasattr(settings, 'CSP_MEDIA_SRC'):
-            csp_parts.append(f"media-src {' '.join(settings.CSP_MEDIA_SRC)}")
-        
-        if hasattr(settings, 'CSP_CONNECT_SRC'):
-            csp_parts.append(f"connect-src {' '.join(settings.CSP_CONNECT_SRC)}")
-        
-        response['Content-Security-Policy'] = '; '.join(csp_parts)
-        
+        for directive, setting in cls.CSP_DIRECTIVES:
+            sources = getattr(csp, setting, None)
+            if sources is not None:
+                csp_parts.append(f"{directive} {' '.join(sources)}")
+        return '; '.join(csp_parts)
+    
+    def process_response(self, request, response):
+        """Add security headers"""
+        for header, value in self.headers.items():
+            response[header] = value
         return response
@@ -0,0 +1,73 @@
+import base64
+import json
+from array import array
+
+from django.db import migrations, models
+
+# Mirrors dashboard.face_utils.ENCODING_FORMAT_*
+ENCODING_FORMAT_F32 = 1
+ENCODING_FORMAT_I8 = 2
+
+
+def json_to_binary(apps, schema_editor):
+    FaceEncoding = apps.get_model('dashboard', 'FaceEncoding')
+    for enc in FaceEncoding.objects.only('id', 'encoding_data').iterator():
+        blob = b''
+        try:
+            data = json.loads(enc.encoding_data)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            if data.get('version') == 'opencv_sface_i8_v1':
+                blob = bytes((ENCODING_FORMAT_I8,)) + base64.b64decode(data['encoding'])
+            elif data.get('version') == 'opencv_sface_v1':
+                blob = bytes((ENCODING_FORMAT_F32,)) + array('f', data['encoding']).tobytes()
+        FaceEncoding.objects.filter(pk=enc.pk).update(encoding_blob=blob)
+
+
+def binary_to_json(apps, schema_editor):
+    FaceEncoding = apps.get_model('dashboard', 'FaceEncoding')
+    for enc in FaceEncoding.objects.only('id', 'encoding_blob').iterator():
+        blob = bytes(enc.encoding_blob)
+        data = {}
+        if blob[:1] == bytes((ENCODING_FORMAT_I8,)):
+            data = {'encoding': base64.b64encode(blob[1:]).decode('ascii'), 'version': 'opencv_sface_i8_v1'}
+        elif blob[:1] == bytes((ENCODING_FORMAT_F32,)):
+            data = {'encoding': array('f', blob[1:]).tolist(), 'version': 'opencv_sface_v1'}
+        FaceEncoding.objects.filter(pk=enc.pk).update(encoding_data=json.dumps(data))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_student_secondary_phone_alter_student_phone_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceencoding',
+            name='encoding_blob',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        # Give the JSON column a default so RemoveField can be reversed
+        migrations.AlterField(
+            model_name='faceencoding',
+            name='encoding_data',
+            field=models.TextField(default='', help_text='JSON serialized face encoding array'),
+        ),
+        migrations.RemoveField(
+            model_name='faceencoding',
+            name='encoding_data',
+        ),
+        migrations.RenameField(
+            model_name='faceencoding',
+            old_name='encoding_blob',
+            new_name='encoding_data',
+        ),
+        migrations.AlterField(
+            model_name='faceencoding',
+            name='encoding_data',
+            field=models.BinaryField(help_text='1-byte format header followed by the raw embedding bytes'),
+        ),
+    ]
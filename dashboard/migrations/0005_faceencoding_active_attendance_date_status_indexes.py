@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_faceencoding_binary_encoding_data'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['date', 'status'], name='dashboard_a_date_a0fa5a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faceencoding',
+            index=models.Index(fields=['is_active', 'student'], name='dashboard_f_is_acti_27aec2_idx'),
+        ),
+    ]
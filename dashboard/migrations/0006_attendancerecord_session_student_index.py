@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_faceencoding_active_attendance_date_status_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['session', 'student'], name='attrec_sess_stu_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+def drop_duplicate_marks(apps, schema_editor):
+    """Keep the earliest record for each (session, student) pair"""
+    AttendanceRecord = apps.get_model('dashboard', 'AttendanceRecord')
+    seen = set()
+    duplicate_ids = []
+    rows = AttendanceRecord.objects.filter(session__isnull=False).order_by('pk').values_list(
+        'pk', 'session_id', 'student_id'
+    )
+    for pk, session_id, student_id in rows.iterator(chunk_size=2000):
+        if (session_id, student_id) in seen:
+            duplicate_ids.append(pk)
+        else:
+            seen.add((session_id, student_id))
+    for start in range(0, len(duplicate_ids), 500):
+        AttendanceRecord.objects.filter(pk__in=duplicate_ids[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_attendancerecord_session_student_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_marks, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='attendancerecord',
+            name='attrec_sess_stu_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='attendancerecord',
+            constraint=models.UniqueConstraint(fields=('session', 'student'), name='uniq_session_student'),
+        ),
+    ]
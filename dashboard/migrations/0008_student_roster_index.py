@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_attendancerecord_uniq_session_student'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['class_year', 'division'], name='student_active_roster_idx'),
+        ),
+    ]
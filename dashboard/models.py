@@ -156,6 +156,16 @@ class LectureSchedule(models.Model):
         unique_together = ['class_year', 'division', 'lecture_period', 'weekday']
 
 
+class AttendanceSessionQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Join the foreign keys session listings display, so iterating the
+        result doesn't issue a query per session:
+        AttendanceSession.objects.filter(...).with_related()
+        """
+        return self.select_related('division', 'subject', 'lecture_period', 'faculty')
+
+
 class AttendanceSession(models.Model):
     """Tracks each attendance-taking session"""
     SESSION_STATUS = [
@@ -190,6 +200,8 @@ class AttendanceSession(models.Model):
     notes = models.TextField(blank=True, help_text="Optional notes about this session")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AttendanceSessionQuerySet.as_manager()
+
     def __str__(self):
         return f"Session {self.id} | {self.class_year}-{self.division.name} | {self.subject.code} | {self.date}"
 
@@ -200,6 +212,15 @@ class AttendanceSession(models.Model):
             models.Index(fields=['status']),
         ]
 
+    def get_roster(self):
+        """Active students of this class/division, plus those with no division"""
+        return Student.objects.filter(
+            class_year=self.class_year,
+            is_active=True
+        ).filter(
+            models.Q(division_id=self.division_id) | models.Q(division__isnull=True)
+        )
+
     def end_session(self):
         """Mark session as completed and calculate statistics"""
         self.ended_at = timezone.now()
@@ -215,13 +236,15 @@ class AttendanceSession(models.Model):
         
         self.total_students = total_students
         
-        # Count present students
-        self.present_count = AttendanceRecord.objects.filter(
-            session=self,
-            status='present'
-        ).count()
-        
-        self.absent_count = self.total_students - self.present_count
+        # Recount from the records rather than trusting the running
+        # present_count: closing happens once and its numbers are permanent,
+        # so late or racing frames must not leave them off
+        counts = AttendanceRecord.objects.filter(session=self).aggregate(
+            present=models.Count('id', filter=models.Q(status='present')),
+            absent=models.Count('id', filter=models.Q(status='absent'))
+        )
+        self.present_count = counts['present']
+        self.absent_count = counts['absent']
         self.save()
 
     def get_attendance_percentage(self):
@@ -292,6 +315,12 @@ class Student(models.Model):
         ordering = ['class_year', 'roll_number']
         indexes = [
             models.Index(fields=['class_year', 'division']),
+            # Session roster: class_year=, division= (or NULL) over active students
+            models.Index(
+                fields=['class_year', 'division'],
+                condition=models.Q(is_active=True),
+                name='student_active_roster_idx',
+            ),
             models.Index(fields=['is_trained', 'is_active']),
         ]
 
@@ -299,7 +328,7 @@ class Student(models.Model):
 class FaceEncoding(models.Model):
     """Store face encoding data for each student"""
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='face_encodings')
-    encoding_data = models.TextField(help_text="JSON serialized face encoding array")
+    encoding_data = models.BinaryField(help_text="1-byte format header followed by the raw embedding bytes")
     image_path = models.CharField(max_length=500, help_text="Path to stored face image")
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
@@ -309,6 +338,19 @@ class FaceEncoding(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'student']),
+        ]
+
+
+class AttendanceRecordQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Join the student, session, subject and lecture period, so listing
+        records doesn't issue a query per row:
+        AttendanceRecord.objects.filter(...).with_related()
+        """
+        return self.select_related('student', 'session', 'subject', 'lecture_period')
 
 
 class AttendanceRecord(models.Model):
@@ -355,6 +397,8 @@ class AttendanceRecord(models.Model):
     time = models.TimeField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AttendanceRecordQuerySet.as_manager()
+
     def __str__(self):
         subject_code = self.subject.code if self.subject else 'N/A'
         return f"{self.student.name} - {subject_code} - {self.date} - {self.status}"
@@ -366,4 +410,10 @@ class AttendanceRecord(models.Model):
             models.Index(fields=['student', 'date']),
             models.Index(fields=['session', 'status']),
             models.Index(fields=['subject', 'date']),
+            models.Index(fields=['date', 'status']),
+        ]
+        constraints = [
+            # One mark per student per session; its index also serves the
+            # duplicate-mark lookup in auto_mark_attendance
+            models.UniqueConstraint(fields=['session', 'student'], name='uniq_session_student'),
         ]
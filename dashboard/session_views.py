@@ -2,20 +2,28 @@
 Session-based attendance views for RollVision
 Handles starting/ending attendance sessions and continuous face detection
 """
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Exists, F, OuterRef
 from django.db.utils import OperationalError
 from django.core.cache import cache
 from datetime import date, datetime, timedelta
+import base64
 import json
 import logging
-import time
+import tempfile
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 
 from .models import (
     Student, AttendanceRecord, AttendanceSession,
@@ -25,6 +33,11 @@ from .forms import AttendanceSessionForm
 from .face_utils import face_recognizer, FaceDetectionError
 from .decorators import audit_log, validate_json_request
 
+try:
+    from .tasks import recognize_frame  # Optional: needs Celery
+except ImportError:
+    recognize_frame = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,7 +51,7 @@ def start_attendance_session_view(request):
             try:
                 with transaction.atomic():
                     # Create new attendance session
-                    session = AttendanceSession.objects.create(
+                    session = AttendanceSession(
                         class_year=form.cleaned_data['class_year'],
                         division=form.cleaned_data['division'],
                         subject=form.cleaned_data['subject'],
@@ -48,6 +61,10 @@ def start_attendance_session_view(request):
                         status='active',
                         notes=form.cleaned_data.get('notes', '')
                     )
+                    # The roster size is fixed for the session; count it once
+                    # here instead of on every recognized frame
+                    session.total_students = session.get_roster().count()
+                    session.save()
                     
                     logger.info(f"Attendance session {session.id} started for {session.class_year}-{session.division.name}")
                     
@@ -64,7 +81,7 @@ def start_attendance_session_view(request):
     active_sessions = AttendanceSession.objects.filter(
         status='active',
         date=date.today()
-    ).select_related('division', 'subject', 'lecture_period')[:10]
+    ).with_related()[:10]
     
     context = {
         'form': form,
@@ -76,28 +93,36 @@ def start_attendance_session_view(request):
 @login_required
 def mark_attendance_live(request, session_id):
     """Live attendance marking page with continuous detection"""
-    session = get_object_or_404(AttendanceSession, pk=session_id)
+    session = get_object_or_404(AttendanceSession.objects.with_related(), pk=session_id)
     
     if session.status != 'active':
         return render(request, 'dashboard/session_closed.html', {'session': session})
     
     # Get ALL students for this class/division (trained and untrained)
     # Include students with no division assigned OR matching division
-    all_students = Student.objects.filter(
-        class_year=session.class_year,
-        is_active=True
-    ).filter(
-        Q(division=session.division) | Q(division__isnull=True)
-    ).order_by('roll_number')
+    # One query for the columns the page uses; split and count in Python
+    all_students = list(session.get_roster().order_by('roll_number').only(
+        'id', 'student_id', 'name', 'roll_number', 'is_trained'
+    ))
     
     # Separate trained and untrained students
-    trained_students = all_students.filter(is_trained=True)
-    untrained_students = all_students.filter(is_trained=False)
+    trained_students = [student for student in all_students if student.is_trained]
+    untrained_students = [student for student in all_students if not student.is_trained]
+    counts = {
+        'total': len(all_students),
+        'trained': len(trained_students),
+        'untrained': len(untrained_students),
+    }
     
-    # Get already marked students
-    marked_students = AttendanceRecord.objects.filter(
+    # Sessions started before total_students was filled in at start
+    if session.total_students != counts['total']:
+        session.total_students = counts['total']
+        session.save(update_fields=['total_students'])
+    
+    # Get already marked students (a set for the template's membership checks)
+    marked_students = set(AttendanceRecord.objects.filter(
         session=session
-    ).select_related('student').values_list('student__id', flat=True)
+    ).values_list('student_id', flat=True))
     
     context = {
         'session': session,
@@ -105,9 +130,9 @@ def mark_attendance_live(request, session_id):
         'trained_students': trained_students,
         'untrained_students': untrained_students,
         'students': all_students,  # For template compatibility
-        'total_students': all_students.count(),
-        'trained_count': trained_students.count(),
-        'untrained_count': untrained_students.count(),
+        'total_students': counts['total'],
+        'trained_count': counts['trained'],
+        'untrained_count': counts['untrained'],
         'present_count': len(marked_students),
         'marked_students': marked_students,
     }
@@ -122,11 +147,18 @@ def auto_mark_attendance(request):
     logger.info("Auto attendance marking requested")
     
     try:
-        data = json.loads(request.body)
-        session_id = data.get('session_id')
-        face_image_base64 = data.get('face_image')
+        if request.content_type.startswith('image/'):
+            # Raw JPEG body with the session in a header: no base64 inflation
+            session_id = request.headers.get('X-Session-Id')
+            face_image_bytes = request.body
+            face_image_base64 = None
+        else:
+            data = json.loads(request.body)
+            session_id = data.get('session_id')
+            face_image_base64 = data.get('face_image')
+            face_image_bytes = None
         
-        if not session_id or not face_image_base64:
+        if not session_id or not (face_image_bytes or face_image_base64):
             return JsonResponse({
                 'success': False,
                 'message': 'Missing session_id or face_image'
@@ -141,24 +173,87 @@ def auto_mark_attendance(request):
                 'message': 'Session not found or already closed'
             }, status=404)
         
-        # LBPH model is global and loaded at startup
-        # No session-specific training needed for LBPH
-
+        # Hand the frame to a Celery worker when async recognition is on;
+        # the browser polls /api/task-status/<task_id>/ for the result
+        if recognize_frame is not None and settings.ASYNC_RECOGNITION:
+            if face_image_base64 is None:
+                # Task arguments travel as JSON
+                face_image_base64 = base64.b64encode(face_image_bytes).decode('ascii')
+            task = recognize_frame.delay(session.pk, face_image_base64)
+            return JsonResponse({
+                'success': True,
+                'pending': True,
+                'task_id': task.id
+            }, status=202)
         
-        # Convert base64 to image
-        image = face_recognizer.base64_to_image(face_image_base64)
+        # Decode the frame
+        if face_image_bytes is not None:
+            image = face_recognizer.bytes_to_image(face_image_bytes)
+        else:
+            image = face_recognizer.base64_to_image(face_image_base64)
         
+        return frame_response(*process_attendance_frame(session, image))
+        
+    except Exception as e:
+        logger.error(f"Error in auto attendance marking: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'message': f'An error occurred: {str(e)}' # Expose error details
+        }, status=500)
+
+
+def frame_response(payload, status):
+    """HTTP response for a process_attendance_frame result"""
+    if payload is None:
+        return HttpResponse(status=status)
+    return JsonResponse(payload, status=status)
+
+
+def process_attendance_frame(session, image):
+    """
+    Detect, recognize and mark every face in one frame of a live session
+    Returns (payload, status) for the JSON response, or (None, 204) when
+    no face was found; shared by auto_mark_attendance and the
+    recognize_frame Celery task.
+    """
+    try:
         # ✅ MULTI-FACE RECOGNITION: Detect and recognize ALL faces in frame
-        results = face_recognizer.recognize_faces(image)
+        # (SSD runs every few frames; faces are followed in between)
+        faces, static, frame_hash = face_recognizer.track_faces(image, session.pk)
+        if static:
+            # Nearly identical to a frame whose faces were all recognized
+            # and marked: skip SFace, matching and the DB. The page keeps
+            # its overlay for 'skipped' frames
+            return {
+                'success': False,
+                'skipped': True,
+                'message': 'Frame unchanged'
+            }, 200
+        
+        results = face_recognizer.recognize_faces(
+            image, faces=faces, class_key=(session.class_year, session.division_id)
+        )
         
         if not results:
-            return JsonResponse({
-                'success': False,
-                'message': 'No faces detected in frame'
-            })
+            # Most frames of a live session: nothing to report, no body
+            face_recognizer.confirm_frame(session.pk, frame_hash)
+            return None, 204
         
         # Process all detected faces
         recognized_students = []
+        new_records = []
+        queued_ids = set()
+        
+        # Look up every recognized student and their existing records up
+        # front: two queries per frame instead of two per face
+        students = Student.objects.in_bulk(
+            {r['student_id'] for r in results if r.get('student_id') is not None},
+            field_name='student_id'
+        )
+        marked_times = dict(AttendanceRecord.objects.filter(
+            session=session,
+            student_id__in=[student.pk for student in students.values()]
+        ).values_list('student_id', 'time'))
         
         for result in results:
             student_id = result.get('student_id')
@@ -174,93 +269,109 @@ def auto_mark_attendance(request):
                 continue
         
             # Get student
-            try:
-                student = Student.objects.get(student_id=student_id)
-            except Student.DoesNotExist:
+            student = students.get(student_id)
+            if student is None:
                 logger.warning(f"Student with student_id '{student_id}' not found in database")
                 continue  # Skip to next face
         
+            # Same student matched twice in one frame
+            if student.pk in queued_ids:
+                continue
+            
             # FIX 1: Prevent duplicate attendance - Check per SESSION
-            existing_record = AttendanceRecord.objects.filter(
-                student=student,
-                session=session
-            ).first()
+            marked_time = marked_times.get(student.pk)
             
-            if existing_record:
+            if marked_time is not None:
                 logger.info(f"Student {student.name} already marked in this session")
                 # Still add to results for frontend feedback
                 recognized_students.append({
                     'student_id': student.student_id,
                     'name': student.name,
                     'already_marked': True,
-                    'time': existing_record.time.strftime('%H:%M:%S'),
+                    'time': marked_time.strftime('%H:%M:%S'),
                     'face_rect': face_rect  # Include rect for visual feedback!
                 })
                 continue  # Skip to next face
             
             
-            # Mark attendance with retry logic for database locks
-            max_retries = 3
-            retry_delay = 0.1  # Start with 100ms
+            # Queue the record; all new marks are written together below
+            new_records.append(AttendanceRecord(
+                student=student,
+                session=session,
+                subject=session.subject,
+                lecture_period=session.lecture_period,
+                date=session.date,
+                status='present',
+                marked_by_face=True,
+                confidence_score=confidence / 100.0  # Convert percentage to 0-1 scale
+            ))
+            queued_ids.add(student.pk)
             
-            for attempt in range(max_retries):
-                try:
-                    with transaction.atomic():
-                        attendance = AttendanceRecord.objects.create(
-                            student=student,
-                            session=session,
-                            subject=session.subject,
-                            lecture_period=session.lecture_period,
-                            date=session.date,
-                            status='present',
-                            marked_by_face=True,
-                            confidence_score=confidence / 100.0  # Convert percentage to 0-1 scale
-                        )
-                        
-                        # Update session present count
-                        session.present_count = AttendanceRecord.objects.filter(
-                            session=session,
-                            status='present'
-                        ).count()
-                        session.save(update_fields=['present_count'])
-                    
-                    logger.info(f"✅ Attendance marked for {student.name} (ID: {student.student_id}) in session {session.id}")
-                    
-                    # Add to recognized students list
-                    recognized_students.append({
-                        'id': student.id,
-                        'student_id': student.student_id,
-                        'name': student.name,
-                        'class_year': student.class_year,
-                        'roll_number': student.roll_number or 'N/A',
-                        'time': attendance.time.strftime('%H:%M:%S'),
-                        'confidence': round(confidence, 2),
-                        'distance': round(distance, 2),
-                        'already_marked': False,
-                        'face_rect': face_rect  # Include rect for visual feedback
-                    })
-                    
-                    break  # Success, exit retry loop
-                    
-                except OperationalError as e:
-                    if 'database is locked' in str(e).lower() and attempt < max_retries - 1:
-                        logger.warning(f"Database locked, retrying (attempt {attempt + 1}/{max_retries})...")
-                        time.sleep(retry_delay)
-                        retry_delay *= 2  # Exponential backoff
-                        continue
-                    else:
-                        # Final attempt failed or different error
-                        raise
+            # Add to recognized students list ('time' is filled in once saved)
+            recognized_students.append({
+                'id': student.id,
+                'student_id': student.student_id,
+                'name': student.name,
+                'class_year': student.class_year,
+                'roll_number': student.roll_number or 'N/A',
+                'time': None,
+                'confidence': round(confidence, 2),
+                'distance': round(distance, 2),
+                'already_marked': False,
+                'face_rect': face_rect  # Include rect for visual feedback
+            })
+        
+        if new_records:
+            # One INSERT, one read-back and one counter UPDATE per frame,
+            # whatever the face count. The write is the transaction's first
+            # statement, so under WAL a busy writer is waited out by the
+            # connection's busy timeout (DATABASES OPTIONS 'timeout') rather
+            # than failing straight away
+            with transaction.atomic():
+                AttendanceRecord.objects.bulk_create(new_records, ignore_conflicts=True)
+                # ignore_conflicts drops rows a concurrent frame inserted first
+                # (uniq_session_student) and bulk_create still returns them, so
+                # read back what is stored: rows with our marked_at are ours
+                stored = {
+                    student_pk: (marked_at, time)
+                    for student_pk, marked_at, time in AttendanceRecord.objects.filter(
+                        session=session, student_id__in=queued_ids
+                    ).values_list('student_id', 'marked_at', 'time')
+                }
+                inserted = {
+                    attendance.student_id for attendance in new_records
+                    if stored.get(attendance.student_id, (None,))[0] == attendance.marked_at
+                }
+                if inserted:
+                    AttendanceSession.objects.filter(pk=session.pk).update(
+                        present_count=F('present_count') + len(inserted)
+                    )
+            
+            for entry in recognized_students:
+                if entry['already_marked']:
+                    continue
+                marked_at, time = stored.get(entry['id'], (None, None))
+                entry['time'] = time.strftime('%H:%M:%S') if time else None
+                if entry['id'] in inserted:
+                    logger.info(f"✅ Attendance marked for {entry['name']} (ID: {entry['student_id']}) in session {session.id}")
+                else:
+                    # Marked by a concurrent frame in the meantime
+                    entry['already_marked'] = True
+        
+        # Only a frame whose every face was recognized (and written) may
+        # stand in for the frames after it; otherwise keep recognizing
+        if all(students.get(r.get('student_id')) is not None for r in results):
+            face_recognizer.confirm_frame(session.pk, frame_hash)
         
         # Return results for all recognized students
         if not recognized_students:
-            return JsonResponse({
+            return {
                 'success': False,
                 'message': f'Detected {len(results)} face(s), but none were recognized or all already marked',
                 'face_count': len(results),
                 'results': results,  # DEBUG: Show detection metrics
                 'threshold': 0.85
-            })
+            }, 200
         
         # Calculate how many were newly marked vs already marked
         newly_marked = [s for s in recognized_students if not s.get('already_marked', False)]
@@ -270,7 +381,11 @@ def auto_mark_attendance(request):
         if already_marked:
             message += f" ({len(already_marked)} already marked)"
         
-        return JsonResponse({
+        if newly_marked:
+            # Pick up the incremented counter (one point read)
+            session.refresh_from_db(fields=['present_count'])
+        
+        return {
             'success': True,
             'message': message,
             'students': recognized_students,  # Array of all recognized students
@@ -279,33 +394,45 @@ def auto_mark_attendance(request):
             'already_marked_count': len(already_marked),
             'session_stats': {
                 'present_count': session.present_count,
-                'total_students': Student.objects.filter(
-                    class_year=session.class_year,
-                    is_active=True
-                ).filter(
-                    Q(division=session.division) | Q(division__isnull=True)
-                ).count()
+                'total_students': session.total_students
             }
-        })
+        }, 200
         
     except FaceDetectionError as e:
         logger.warning(f"Face detection error: {str(e)}")
-        return JsonResponse({
+        return {
             'success': False,
             'message': str(e)
-        }, status=400)
+        }, 400
     except OperationalError as e:
-        logger.error(f"Database error after retries: {str(e)}")
-        return JsonResponse({
+        logger.error(f"Database error: {str(e)}")
+        return {
             'success': False,
             'message': 'Database is busy. Please try again.'
-        }, status=503)
-    except Exception as e:
-        logger.error(f"Error in auto attendance marking: {str(e)}", exc_info=True)
+        }, 503
+
+
+@require_http_methods(["GET"])
+@login_required
+def task_status(request, task_id):
+    """Poll the result of a frame queued by auto_mark_attendance"""
+    if recognize_frame is None:
         return JsonResponse({
             'success': False,
-            'message': f'An error occurred: {str(e)}' # Expose error details
+            'message': 'Async recognition is not available'
+        }, status=404)
+    
+    result = recognize_frame.AsyncResult(task_id)
+    if not result.ready():
+        return JsonResponse({'success': False, 'pending': True})
+    if result.failed():
+        logger.error(f"Recognition task {task_id} failed: {result.result}")
+        return JsonResponse({
+            'success': False,
+            'message': 'Recognition failed'
         }, status=500)
+    
+    return frame_response(*result.get())
 
 
 @require_http_methods(["POST"])
@@ -331,16 +458,11 @@ def end_attendance_session(request, session_id):
                 is_active=True
             )
             
-            already_marked = AttendanceRecord.objects.filter(
-                session=session
-            ).values_list('student_id', flat=True)
-            
-            absent_students = registered_students.exclude(id__in=already_marked)
-            
-            # Create absent records for unmarked students
+            # Create absent records for every registered student; the
+            # uniq_session_student constraint drops those already marked
             absent_records = [
                 AttendanceRecord(
-                    student=student,
+                    student_id=student_id,
                     session=session,
                     subject=session.subject,
                     lecture_period=session.lecture_period,
@@ -349,12 +471,12 @@ def end_attendance_session(request, session_id):
                     marked_by_face=False,
                     confidence_score=0.0
                 )
-                for student in absent_students
+                for student_id in registered_students.values_list('id', flat=True)
             ]
             
             if absent_records:
-                AttendanceRecord.objects.bulk_create(absent_records)
-                logger.info(f"Auto-marked {len(absent_records)} students as absent")
+                AttendanceRecord.objects.bulk_create(absent_records, batch_size=500, ignore_conflicts=True)
+                logger.info(f"Auto-marked unmarked students of {len(absent_records)} registered as absent")
             
             session.end_session()
             logger.info(f"Attendance session {session.id} ended. Present: {session.present_count}/{session.total_students}")
@@ -381,7 +503,7 @@ def end_attendance_session(request, session_id):
 @login_required
 def session_summary(request, session_id):
     """View session summary after completion"""
-    session = get_object_or_404(AttendanceSession, pk=session_id)
+    session = get_object_or_404(AttendanceSession.objects.with_related(), pk=session_id)
     
     # Get all attendance records for this session
     present_students = AttendanceRecord.objects.filter(
@@ -391,15 +513,9 @@ def session_summary(request, session_id):
     
     # Get absent students
     # Include students with no division OR matching division
-    all_students = Student.objects.filter(
-        class_year=session.class_year,
-        is_active=True
-    ).filter(
-        Q(division=session.division) | Q(division__isnull=True)
-    )
-    
-    present_ids = present_students.values_list('student__id', flat=True)
-    absent_students = all_students.exclude(id__in=present_ids).order_by('roll_number')
+    absent_students = session.get_roster().filter(
+        ~Exists(present_students.filter(student=OuterRef('pk')))
+    ).order_by('roll_number')
     
     context = {
         'session': session,
@@ -411,43 +527,68 @@ def session_summary(request, session_id):
 
 
 # ------------------ Export Session PDF ------------------
+PDF_SPOOL_MAX_SIZE = 4 * 1024 * 1024  # Bytes held in memory before spilling to disk
+
+# Table styles are immutable once built; share them across exports
+SESSION_DETAILS_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+
+def _session_list_style(header_color):
+    """Grid style for a student list table with a coloured header row"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(header_color)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ])
+
+
+SESSION_PRESENT_STYLE = _session_list_style("#28a745")
+SESSION_ABSENT_STYLE = _session_list_style("#dc3545")
+
+
 @login_required
 def export_session_pdf(request, session_id):
     """Export session attendance to PDF"""
-    import io
-    from django.http import HttpResponse
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.lib.units import inch
-
-    session = get_object_or_404(AttendanceSession, pk=session_id)
+    session = get_object_or_404(AttendanceSession.objects.with_related(), pk=session_id)
     
-    # Get attendance data
+    # Get attendance data: only the columns the tables show, each queryset
+    # run once and counted from the fetched rows
     present_records = AttendanceRecord.objects.filter(
         session=session,
         status='present'
-    ).select_related('student').order_by('student__roll_number')
-    
-    # Get absent students
-    all_students = Student.objects.filter(
-        class_year=session.class_year,
-        is_active=True
-    ).filter(
-        Q(division=session.division) | Q(division__isnull=True)
-    )
+    ).order_by('student__roll_number')
+    present_rows = [
+        [student_id, name, roll_number or "-", marked_time.strftime('%H:%M'), "Present"]
+        for student_id, name, roll_number, marked_time in present_records.values_list(
+            'student__student_id', 'student__name', 'student__roll_number', 'time'
+        ).iterator(chunk_size=500)
+    ]
     
-    present_ids = present_records.values_list('student__id', flat=True)
-    absent_students = all_students.exclude(id__in=present_ids).order_by('roll_number')
+    # Get absent students: a NOT EXISTS anti-join the database runs per
+    # roster row against the (session, student) unique index
+    absent_students = session.get_roster().filter(
+        ~Exists(present_records.filter(student=OuterRef('pk')))
+    ).order_by('roll_number')
+    absent_rows = [
+        [student_id, name, roll_number or "-", "Absent"]
+        for student_id, name, roll_number in absent_students.values_list(
+            'student_id', 'name', 'roll_number'
+        ).iterator(chunk_size=500)
+    ]
     
-    # Create Response
-    response = HttpResponse(content_type='application/pdf')
     filename = f"Attendance_{session.class_year}_{session.division.name}_{session.subject.name}_{session.date}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     
-    # Create Document
-    doc = SimpleDocTemplate(response, pagesize=letter)
+    # Create Document in a spooled file: kept in memory for typical class
+    # sizes, rolled over to disk for large rosters
+    pdf_file = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+    doc = SimpleDocTemplate(pdf_file, pagesize=letter)
     elements = []
     styles = getSampleStyleSheet()
     
@@ -462,71 +603,41 @@ def export_session_pdf(request, session_id):
         ["Subject:", f"{session.subject.name} ({session.subject.code})"],
         ["Period:", session.lecture_period.name],
         ["Time:", f"{session.started_at.strftime('%H:%M')} - {session.ended_at.strftime('%H:%M') if session.ended_at else 'Ongoing'}"],
-        ["Total Students:", str(all_students.count())],
-        ["Present:", f"{present_records.count()} ({session.get_attendance_percentage()}%)"],
-        ["Absent:", str(absent_students.count())]
+        ["Total Students:", str(len(present_rows) + len(absent_rows))],
+        ["Present:", f"{len(present_rows)} ({session.get_attendance_percentage()}%)"],
+        ["Absent:", str(len(absent_rows))]
     ]
     
     details_table = Table(details_data, colWidths=[2 * inch, 4 * inch])
-    details_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
+    details_table.setStyle(SESSION_DETAILS_STYLE)
     elements.append(details_table)
     elements.append(Spacer(1, 0.3 * inch))
     
     # PRESENT STUDENTS SECTION
-    if present_records.exists():
+    if present_rows:
         elements.append(Paragraph("Present Students", styles['Heading2']))
         elements.append(Spacer(1, 0.1 * inch))
         
-        present_data = [["ID", "Name", "Roll No", "Time", "Status"]]
-        for record in present_records:
-            present_data.append([
-                record.student.student_id,
-                record.student.name,
-                record.student.roll_number or "-",
-                record.time.strftime('%H:%M'),
-                "Present"
-            ])
+        present_data = [["ID", "Name", "Roll No", "Time", "Status"]] + present_rows
             
         t_present = Table(present_data, colWidths=[1.5*inch, 2.5*inch, 1*inch, 1*inch, 1*inch])
-        t_present.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#28a745")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
+        t_present.setStyle(SESSION_PRESENT_STYLE)
         elements.append(t_present)
         elements.append(Spacer(1, 0.3 * inch))
 
     # ABSENT STUDENTS SECTION
-    if absent_students.exists():
+    if absent_rows:
         elements.append(Paragraph("Absent Students", styles['Heading2']))
         elements.append(Spacer(1, 0.1 * inch))
         
-        absent_data = [["ID", "Name", "Roll No", "Status"]]
-        for student in absent_students:
-            absent_data.append([
-                student.student_id,
-                student.name,
-                student.roll_number or "-",
-                "Absent"
-            ])
+        absent_data = [["ID", "Name", "Roll No", "Status"]] + absent_rows
             
         t_absent = Table(absent_data, colWidths=[1.5*inch, 2.5*inch, 1*inch, 1.5*inch])
-        t_absent.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#dc3545")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
+        t_absent.setStyle(SESSION_ABSENT_STYLE)
         elements.append(t_absent)
 
     doc.build(elements)
-    return response
+    
+    # Stream it back in blocks; FileResponse closes the file when done
+    pdf_file.seek(0)
+    return FileResponse(pdf_file, as_attachment=True, filename=filename, content_type='application/pdf')
@@ -0,0 +1,60 @@
+"""
+Signal handlers for RollVision
+"""
+import sys
+
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Division, FaceEncoding, LecturePeriod, Student, Subject, SystemSettings
+from .context_processors import THEME_CACHE_KEY
+from .forms import DROPDOWN_CACHE_KEYS
+
+
+@receiver(post_save, sender=SystemSettings)
+@receiver(post_delete, sender=SystemSettings)
+def invalidate_theme_cache(sender, **kwargs):
+    """Drop the cached theme so the next render picks up the change"""
+    cache.delete(THEME_CACHE_KEY)
+
+
+@receiver(post_save, sender=Division)
+@receiver(post_delete, sender=Division)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=LecturePeriod)
+@receiver(post_delete, sender=LecturePeriod)
+def invalidate_dropdown_cache(sender, **kwargs):
+    """Drop the cached start-session select options"""
+    cache.delete_many(list(DROPDOWN_CACHE_KEYS.values()))
+
+
+@receiver(post_save, sender=FaceEncoding)
+@receiver(post_delete, sender=FaceEncoding)
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_class_galleries(sender, **kwargs):
+    """Rebuild the per-class recognition galleries on their next use"""
+    # Nothing cached unless the recognizer has been loaded in this process
+    face_utils = sys.modules.get('dashboard.face_utils')
+    if face_utils is not None:
+        face_utils.face_recognizer.invalidate_class_galleries()
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Tune SQLite for concurrent attendance writes
+    WAL lets readers run alongside the single writer and NORMAL syncs on
+    checkpoint instead of on every commit
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA mmap_size=268435456')  # 256MB
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA cache_size=-64000')  # ~64MB
@@ -90,6 +90,24 @@ class FaceCapture {
         return canvas.toDataURL('image/jpeg', 0.95);
     }
 
+    /**
+     * Capture current frame from video as a JPEG Blob (no base64 overhead)
+     */
+    captureFrameBlob() {
+        if (!this.videoElement || !this.videoElement.srcObject) {
+            throw new Error('Webcam not started');
+        }
+
+        const canvas = document.createElement('canvas');
+        canvas.width = this.videoElement.videoWidth;
+        canvas.height = this.videoElement.videoHeight;
+
+        const context = canvas.getContext('2d');
+        context.drawImage(this.videoElement, 0, 0, canvas.width, canvas.height);
+
+        return new Promise((resolve) => canvas.toBlob(resolve, 'image/jpeg', 0.95));
+    }
+
     /**
      * Display captured image in an img element
      */
@@ -158,19 +176,19 @@ async function saveFaceEncoding(studentId, faceImageBase64) {
 
 /**
  * Process face for attendance marking
+ * Sends the raw JPEG Blob as multipart form data
  */
-async function processAttendance(faceImageBase64) {
+async function processAttendance(frameBlob) {
     try {
         const csrftoken = getCSRFToken();
+        const formData = new FormData();
+        formData.append('frame', frameBlob, 'frame.jpg');
         const response = await fetch('/api/process-attendance/', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json',
                 'X-CSRFToken': csrftoken,
             },
-            body: JSON.stringify({
-                face_image: faceImageBase64
-            })
+            body: formData
         });
 
         const data = await response.json();
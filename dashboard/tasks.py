@@ -0,0 +1,36 @@
+"""
+Celery tasks for RollVision
+Run a worker for the recognition and training queues with:
+    celery -A RollVision worker -Q recognition,training
+"""
+from celery import shared_task
+
+from .models import AttendanceSession
+from .face_utils import face_recognizer
+
+
+@shared_task
+def recognize_frame(session_id, face_image_base64):
+    """
+    Recognize and mark the faces in one live-session frame
+    Returns (payload, status) as process_attendance_frame does
+    """
+    from .session_views import process_attendance_frame
+    
+    session = AttendanceSession.objects.filter(pk=session_id, status='active').first()
+    if session is None:
+        return {
+            'success': False,
+            'message': 'Session not found or already closed'
+        }, 404
+    
+    image = face_recognizer.base64_to_image(face_image_base64)
+    return process_attendance_frame(session, image)
+
+
+@shared_task
+def train_faces():
+    """Encode newly registered students (queued by views.trigger_training)"""
+    from .views import train_system_background
+    
+    train_system_background()
@@ -18,6 +18,7 @@ urlpatterns = [
     path('attendance/start-session/', session_views.start_attendance_session_view, name='start_attendance_session'),
     path('attendance/live/<int:session_id>/', session_views.mark_attendance_live, name='mark_attendance_live'),
     path('api/auto-mark-attendance/', session_views.auto_mark_attendance, name='auto_mark_attendance'),
+    path('api/task-status/<str:task_id>/', session_views.task_status, name='task_status'),
     path('attendance/end-session/<int:session_id>/', session_views.end_attendance_session, name='end_attendance_session'),
     path('attendance/session/<int:session_id>/summary/', session_views.session_summary, name='session_summary'),
     path('attendance/session/<int:session_id>/export-pdf/', session_views.export_session_pdf, name='export_session_pdf'),
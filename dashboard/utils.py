@@ -0,0 +1,16 @@
+"""
+Request helpers shared by RollVision's middleware and view decorators
+"""
+
+
+def get_client_ip(request):
+    """Extract client IP address from request, memoized on the request"""
+    ip = getattr(request, '_client_ip', None)
+    if ip is None:
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            ip = x_forwarded_for.split(',', 1)[0].strip()
+        else:
+            ip = request.META.get('REMOTE_ADDR')
+        request._client_ip = ip
+    return ip
@@ -1,19 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse, JsonResponse
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Q, F, Count, Sum, Avg, ExpressionWrapper, FloatField
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
+from django.core.cache import cache
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.contrib.auth.decorators import login_required, permission_required
 from django.utils import timezone
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db import transaction, IntegrityError
+from django.db import connection, transaction, IntegrityError
+from django.core.management import call_command
 from datetime import date, datetime, timedelta
 import json
 import logging
-import cv2
 import io
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet
@@ -27,69 +28,81 @@ from .face_utils import face_recognizer, FaceDetectionError
 from .decorators import audit_log, validate_json_request, require_staff, sanitize_input
 import threading
 
+try:
+    from .tasks import train_faces as train_faces_task  # Optional: needs Celery
+except ImportError:
+    train_faces_task = None
+
 logger = logging.getLogger(__name__)
 
+# Today's stand-alone attendance marks: student pk -> time marked (per process)
+_marked_today = {'date': None, 'times': {}}
+_marked_today_lock = threading.Lock()
+
+# Seconds the dashboard statistics are shared between page views
+DASHBOARD_CACHE_TIMEOUT = 20
+
+# Registrations within this many seconds share one training run
+TRAINING_DEBOUNCE = 15
+TRAINING_LOCK_KEY = 'rv:face-train:lock'
+
+
+def _get_marked_today(today):
+    """Return today's {student pk: time} marks, loading them once per day"""
+    with _marked_today_lock:
+        if _marked_today['date'] != today:
+            _marked_today['times'] = dict(
+                AttendanceRecord.objects.filter(date=today).order_by('marked_at').values_list('student_id', 'time')
+            )
+            _marked_today['date'] = today
+        return _marked_today['times']
+
+
 def train_system_background():
     """
-    Background task to retrain the face recognition model
+    Encode newly registered students' photos and reload the recognizer
+    train_faces skips students already encoded from their current photo,
+    so a run only does the work for the placeholders added since the last one.
     """
     try:
-        # Import here to avoid circular imports if placed elsewhere
-        from .models import Student
-        
-        # Get all students with photos
-        # We start with a delay or lock? No, LBPH training is fast for small sets.
-        # But we valid data.
-        
-        students = Student.objects.exclude(photo='')
-        training_data = []
-        
-        for s in students:
-            if s.photo:
-                try:
-                    training_data.append({
-                        'student_id': s.student_id,
-                        'image_path': s.photo.path
-                    })
-                except Exception as e:
-                    # File might be missing
-                    continue
-        
-        if training_data:
-            logger.info("Starting background model training...")
-            face_recognizer.train_model(training_data)
-            
-            # Update is_trained flag
-            # We assume if they were in the training set, they are "trained"
-            # But simpler to just mark them True if training succeeded.
-            # However, Student model update inside thread might be risky with connections?
-            # Django handles DB in threads usually fine if connections are managed.
-            # For simplicity, we won't bulk update here to avoid race conditions.
-            
+        logger.info("Starting background model training...")
+        call_command('train_faces', workers=1, stdout=io.StringIO())
     except Exception as e:
         logger.error(f"Background training failed: {e}")
 
-def trigger_training():
-    """Fire and forget training task"""
-    t = threading.Thread(target=train_system_background)
-    t.daemon = True
-    t.start()
 
+def _train_in_thread():
+    try:
+        train_system_background()
+    finally:
+        # This thread's DB connection isn't managed by the request cycle
+        connection.close()
+
+
+def trigger_training():
+    """
+    Schedule one training run for a burst of registrations
+    The first call takes a TRAINING_DEBOUNCE-second cache lock and the run
+    starts when it expires, so students registered meanwhile (by any
+    worker) are encoded by that run instead of each starting their own.
+    """
+    if not cache.add(TRAINING_LOCK_KEY, True, TRAINING_DEBOUNCE):
+        return
+    if train_faces_task is not None and settings.ASYNC_TRAINING:
+        train_faces_task.apply_async(countdown=TRAINING_DEBOUNCE)
+    else:
+        t = threading.Timer(TRAINING_DEBOUNCE, _train_in_thread)
+        t.daemon = True
+        t.start()
 
 
 # ------------------ Dashboard ------------------
-@login_required
-def index(request):
-    """Dashboard home page with comprehensive statistics"""
-    from .models import AttendanceSession
-    from datetime import timedelta
-    from django.db.models import Avg, Count
-    
+def _dashboard_context(today):
+    """Build the dashboard statistics as plain, cache-friendly values"""
     total_staff = Faculty.objects.count()
     total_students = Student.objects.count()
     
     # Calculate today's attendance
-    today = date.today()
     present_today = AttendanceRecord.objects.filter(date=today, status='present').count()
     absent_today = AttendanceRecord.objects.filter(date=today, status='absent').count()
     
@@ -104,37 +117,38 @@ def index(request):
         attendance_rate = 0
 
     # Recent sessions (last 5)
-    recent_sessions_qs = AttendanceSession.objects.select_related(
-        'division', 'subject', 'lecture_period'
-    ).filter(status='completed').order_by('-date', '-started_at')[:5]
+    recent_sessions_qs = AttendanceSession.objects.with_related().filter(status='completed').order_by('-date', '-started_at')[:5]
 
     recent_sessions = []
     for session in recent_sessions_qs:
-        # Pre-format strings to concise attributes to prevent wrapper issues in template
-        session.display_title = f"{session.class_year}-{session.division.name} | {session.subject.code}"
-        session.display_date = f"{session.date.strftime('%b %d, %Y')} - {session.lecture_period.name}"
-        session.display_badge = f"{session.present_count}/{session.total_students}"
-        recent_sessions.append(session)
+        # Pre-format strings to concise values to prevent wrapper issues in template
+        recent_sessions.append({
+            'display_title': f"{session.class_year}-{session.division.name} | {session.subject.code}",
+            'display_date': f"{session.date.strftime('%b %d, %Y')} - {session.lecture_period.name}",
+            'display_badge': f"{session.present_count}/{session.total_students}",
+        })
     
     # --- 1. Attendance Trend (Last 7 Days) ---
     attendance_trend_labels = []
     attendance_trend_data = []
     
+    # One grouped query for the whole week instead of two per day
+    trend_rows = AttendanceSession.objects.filter(
+        status='completed', date__gte=today - timedelta(days=6), date__lte=today
+    ).values('date').annotate(
+        total_present=Sum('present_count'),
+        total_capacity=Sum('total_students')
+    ).order_by()
+    trend_by_date = {row['date']: row for row in trend_rows}
+    
     for i in range(6, -1, -1):
         day = today - timedelta(days=i)
         label = day.strftime("%a") # Mon, Tue...
         
-        # Get all sessions for this day
-        day_sessions = AttendanceSession.objects.filter(date=day, status='completed')
-        
-        if day_sessions.exists():
-            # Calculate average attendance % for this day across all sessions
+        stats = trend_by_date.get(day)
+        if stats:
+            # Average attendance % for this day across all sessions
             # Formula: (Sum of present_count / Sum of total_students) * 100
-            stats = day_sessions.aggregate(
-                total_present=Sum('present_count'),
-                total_capacity=Sum('total_students')
-            )
-            
             day_present = stats['total_present'] or 0
             day_capacity = stats['total_capacity'] or 1 # Avoid division by zero
             
@@ -146,28 +160,32 @@ def index(request):
         attendance_trend_labels.append(label)
     
     # --- 2. Defaulters (Attendance < 75%) ---
-    # We need to aggregate attendance for all students
-    all_students_stats = Student.objects.filter(is_active=True).annotate(
-        total_presents=Count('attendance_records', filter=Q(attendance_records__status='present')),
-        # We can approximate total sessions by counting distinct sessions they could have attended or just all their records
-        # For simplicity and accuracy with current model, we count their total attendance records
-        total_records=Count('attendance_records')
+    # Percentage and threshold are computed in SQL so only the ten worst
+    # students come back. Students with fewer than 5 records are skipped to
+    # avoid noise.
+    defaulter_qs = (
+        Student.objects.filter(is_active=True)
+        .select_related('division')
+        .annotate(
+            total_presents=Count('attendance_records', filter=Q(attendance_records__status='present')),
+            total_records=Count('attendance_records'),
+        )
+        .filter(total_records__gte=5)
+        .annotate(attendance_percentage=ExpressionWrapper(
+            100.0 * F('total_presents') / F('total_records'), output_field=FloatField()))
+        .filter(attendance_percentage__lt=75)
+        .order_by('attendance_percentage')[:10]
     )
-    
     defaulters = []
-    for s in all_students_stats:
-        if s.total_records >= 5: # Only consider students with at least 5 records to avoid noise
-            pct = (s.total_presents / s.total_records) * 100
-            if pct < 75:
-                s.attendance_percentage = round(pct, 1) # Add attribute for template
-                # Format subtitle for template
-            s.display_subtitle = f"{s.student_id} | {s.class_year}-{s.division.name}"
-            defaulters.append(s)
-    
-    # limit to top 10 defaulters
-    defaulters = defaulters[:10]
+    for s in defaulter_qs:
+        division = s.division.name if s.division else '-'
+        defaulters.append({
+            'name': s.name,
+            'display_subtitle': f"{s.student_id} | {s.class_year}-{division}",
+            'attendance_percentage': round(s.attendance_percentage, 1),
+        })
     
-    return render(request, 'dashboard/index.html', {
+    return {
         "total_staff": total_staff,
         "total_students": total_students,
         "attendance_rate": attendance_rate,
@@ -178,7 +196,21 @@ def index(request):
         "defaulters": defaulters,
         "attendance_trend_labels": json.dumps(attendance_trend_labels),
         "attendance_trend_data": json.dumps(attendance_trend_data),
-    })
+    }
+
+
+@login_required
+def index(request):
+    """Dashboard home page with comprehensive statistics"""
+    # The numbers are the same for every user, so share them for a few
+    # seconds instead of recomputing them on each page view
+    today = date.today()
+    context = cache.get_or_set(
+        f'rv:dashboard:index:{today.isoformat()}',
+        lambda: _dashboard_context(today),
+        DASHBOARD_CACHE_TIMEOUT
+    )
+    return render(request, 'dashboard/index.html', context)
 
 
 # ------------------ Faculty ------------------
@@ -186,15 +218,24 @@ def index(request):
 @require_staff
 def faculty(request):
     query = request.GET.get("q", "")
-    employees = Faculty.objects.all()
+    employees = Faculty.objects.order_by("name", "pk")
 
     if query:
-        employees = Faculty.objects.filter(
+        employees = employees.filter(
             Q(name__icontains=query) |
             Q(department__icontains=query) |
             Q(subject__icontains=query)
         )
 
+    # Paginate results
+    paginator = Paginator(employees, 50)  # Show 50 employees per page
+    try:
+        page_obj = paginator.page(request.GET.get("page", 1))
+    except PageNotAnInteger:
+        page_obj = paginator.page(1)
+    except EmptyPage:
+        page_obj = paginator.page(paginator.num_pages)
+
     form = FacultyForm()
 
     if request.method == "POST":
@@ -205,7 +246,8 @@ def faculty(request):
             return redirect("faculty")
 
     return render(request, "dashboard/faculty.html", {
-        "employees": employees,
+        "employees": page_obj,
+        "page_obj": page_obj,
         "form": form,
         "query": query,
     })
@@ -251,9 +293,10 @@ def export_employees_pdf(request):
     elements.append(Paragraph("Faculty & Staff List", styles["Heading1"]))
     elements.append(Spacer(1, 20))
 
+    # Only the three printed columns, streamed in chunks
     data = [["Name", "Department", "Subject"]]
-    for emp in employees:
-        data.append([emp.name, emp.department, emp.subject])
+    rows = employees.values_list("name", "department", "subject").iterator(chunk_size=500)
+    data.extend(list(row) for row in rows)
 
     table = Table(data, colWidths=[200, 150, 150])
     table.setStyle(TableStyle([
@@ -387,7 +430,7 @@ def students(request):
                             # Create a record for history (optional, or with dummy data)
                             FaceEncoding.objects.create(
                                 student=student,
-                                encoding_data=json.dumps({'version': 'lbph_v1'}), # Dummy valid JSON
+                                encoding_data=b'',  # Placeholder; train_faces writes the real encoding
                                 image_path=image_path,
                                 is_active=True
                             )
@@ -407,30 +450,17 @@ def students(request):
                     try:
                         logger.info(f"Processing uploaded photo for {student_id}")
                         
-                        # Read uploaded photo
-                        from PIL import Image, ImageOps
-                        import io
-                        
-                        image_data = photo.read()
-                        image = Image.open(io.BytesIO(image_data))
-                        
-                        # Handle EXIF rotation (iPhone/Android photos)
-                        image = ImageOps.exif_transpose(image)
-                        
-                        # Convert to RGB if needed
-                        if image.mode != 'RGB':
-                            image = image.convert('RGB')
-                        
-                        # Convert to numpy array (ensure uint8 format)
-                        import numpy as np
-                        image_np = np.array(image, dtype=np.uint8)
-                        
-                        # Convert RGB (PIL) to BGR (OpenCV)
-                        # face_utils.py expects BGR images (standard OpenCV format)
-                        image_array = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+                        # Decode straight to BGR, the format face_utils expects.
+                        # cv2's IMREAD_COLOR also applies the EXIF rotation of
+                        # iPhone/Android photos, so no PIL round trip is needed.
+                        photo.seek(0)  # Saving the student above read it to the end
+                        image_array = face_recognizer.bytes_to_image(photo.read())
                         
                         # Verify face quality
-                        success, message, faces = face_recognizer.verify_face_quality(image_array)
+                        if image_array is None:
+                            success, message, faces = False, "Could not read the uploaded photo", []
+                        else:
+                            success, message, faces = face_recognizer.verify_face_quality(image_array)
                         
                         if not success:
                             face_error_message = message
@@ -452,7 +482,7 @@ def students(request):
                             
                             FaceEncoding.objects.create(
                                 student=student,
-                                encoding_data=json.dumps({'version': 'lbph_v1'}),
+                                encoding_data=b'',
                                 image_path=image_path,
                                 is_active=True
                             )
@@ -518,7 +548,7 @@ def students(request):
 def _get_report_data(request):
     """Helper to extract report data based on filters"""
     # Base QuerySets
-    sessions = AttendanceSession.objects.filter(status='completed').select_related('division', 'subject', 'lecture_period').order_by('-date')
+    sessions = AttendanceSession.objects.filter(status='completed').with_related().order_by('-date')
     all_students = Student.objects.filter(is_active=True)
     
     # --- FILTERS ---
@@ -540,29 +570,30 @@ def _get_report_data(request):
         division_obj = Division.objects.filter(id=division_id).first()
         
     # 1. Stats Cards (Based on Filtered Data)
-    total_sessions = sessions.count()
+    # Session count and sums come from one aggregate over the filtered sessions
+    totals = sessions.aggregate(
+        total_sessions=Count('id'),
+        total_present=Sum('present_count'),
+        total_capacity=Sum('total_students')
+    )
+    total_sessions = totals['total_sessions']
     total_students = all_students.count() 
     
     # 2. Average Attendance (Overall for filtered sessions)
-    total_present = sessions.aggregate(Sum('present_count'))['present_count__sum'] or 0
-    total_capacity = sessions.aggregate(Sum('total_students'))['total_students__sum'] or 0
+    total_present = totals['total_present'] or 0
+    total_capacity = totals['total_capacity'] or 0
     
     avg_attendance = 0
     if total_capacity > 0:
         avg_attendance = round((total_present / total_capacity) * 100, 1)
         
-    # 3. Defaulters (Students < 75%)
-    student_stats = all_students.annotate(
+    # 3. Defaulters (Students < 75%), counted in the database
+    defaulters_count = all_students.annotate(
         total_recs=Count('attendance_records'),
         present_recs=Count('attendance_records', filter=Q(attendance_records__status='present'))
-    )
-    
-    defaulters_count = 0
-    for s in student_stats:
-        if s.total_recs > 0:
-            pct = (s.present_recs / s.total_recs) * 100
-            if pct < 75:
-                defaulters_count += 1
+    ).filter(total_recs__gt=0).annotate(
+        pct=ExpressionWrapper(100.0 * F('present_recs') / F('total_recs'), output_field=FloatField())
+    ).filter(pct__lt=75).count()
     
     divisions = Division.objects.all().order_by('name')
     
@@ -617,8 +648,7 @@ def export_reports_pdf(request):
     filename = f"Attendance_Report_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc = SimpleDocTemplate(response, pagesize=letter)
     elements = []
     
     styles = getSampleStyleSheet()
@@ -689,9 +719,6 @@ def export_reports_pdf(request):
     elements.append(t_data)
     
     doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
     return response
 
 
@@ -765,7 +792,7 @@ def save_face_encoding(request):
     logger.info("Face encoding save requested")
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
+            data = request._cached_json
             student_id = data.get('student_id', '').strip()
             face_image_base64 = data.get('face_image', '').strip()
             
@@ -803,7 +830,7 @@ def save_face_encoding(request):
             
             FaceEncoding.objects.create(
                 student=student,
-                encoding_data=json.dumps(encoding),
+                encoding_data=encoding,
                 image_path=image_path,
                 is_active=True
             )
@@ -811,6 +838,9 @@ def save_face_encoding(request):
             student.is_trained = True
             student.save()
             
+            # Recognizable immediately, without reloading every encoding
+            face_recognizer.add_encoding(student_id, encoding)
+            
             logger.info(f"✅ Face encoding saved successfully for {student.name} ({student_id})")
             
             return JsonResponse({'success': True, 'message': 'Face registered successfully!', 'image_path': image_path})
@@ -845,16 +875,15 @@ def mark_attendance_view(request):
 @ensure_csrf_cookie
 @login_required
 @audit_log
-@validate_json_request
 def process_attendance(request):
     """API endpoint to process face recognition for attendance (Updated to use LBPH)"""
     logger.info("Attendance processing requested (Legacy/Stand-alone)")
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            face_image_base64 = data.get('face_image')
+            # Raw JPEG frame as multipart upload (no JSON/base64 round trip)
+            frame = request.FILES.get('frame')
             
-            if not face_image_base64:
+            if frame is None:
                 return JsonResponse({
                     'success': False,
                     'message': 'No face image provided'
@@ -862,11 +891,10 @@ def process_attendance(request):
             
             # LBPH detection (No on-the-fly training needed)
             
-            # Convert base64 to image
-            try:
-                image = face_recognizer.base64_to_image(face_image_base64)
-            except Exception as e:
-                logger.error(f"Image decode error: {e}")
+            # Decode JPEG bytes to image
+            image = face_recognizer.bytes_to_image(frame.read())
+            if image is None:
+                logger.error("Image decode error: could not decode uploaded frame")
                 return JsonResponse({'success': False, 'message': 'Invalid image data'}, status=400)
             
             # Recognize faces using LBPH
@@ -890,6 +918,14 @@ def process_attendance(request):
             processed_students = []
             all_face_rects = []
             
+            # One query for every recognized student instead of one per face
+            today = date.today()
+            marked_today = _get_marked_today(today)
+            students = Student.objects.in_bulk(
+                {r['student_id'] for r in results if r.get('student_id') is not None},
+                field_name='student_id'
+            )
+            
             for result in results:
                 student_id = result.get('student_id')
                 confidence = result.get('confidence', 0)
@@ -908,21 +944,22 @@ def process_attendance(request):
                 if student_id is None:
                     continue
                 
-                # Get student
-                try:
-                    student = Student.objects.get(student_id=student_id) # LBPH map uses student_id string usually? 
-                    # Wait, in face_utils.py: self.student_map = {int(k): v ...} where v is student_id string. 
-                    # So result['student_id'] is the string ID (e.g., "STD001").
-                except Student.DoesNotExist:
+                # Get student (result['student_id'] is the string ID, e.g. "STD001")
+                student = students.get(student_id)
+                if student is None:
                     logger.warning(f"Recognized ID {student_id} not found in DB")
                     continue
                 
-                # Check attendance for TODAY
-                today = date.today()
-                existing_record = AttendanceRecord.objects.filter(
-                    student=student,
-                    date=today
-                ).first()
+                # Check attendance for TODAY; only go to the DB on this
+                # process's first sighting of the student today
+                marked_time = marked_today.get(student.pk)
+                if marked_time is None:
+                    existing_record = AttendanceRecord.objects.filter(
+                        student=student,
+                        date=today
+                    ).first()
+                    if existing_record:
+                        marked_time = marked_today[student.pk] = existing_record.time
                 
                 student_data = {
                     'name': student.name,
@@ -934,9 +971,9 @@ def process_attendance(request):
                     }
                 }
                 
-                if existing_record:
+                if marked_time is not None:
                     student_data['status'] = 'already_marked'
-                    student_data['time'] = existing_record.time.strftime("%H:%M:%S")
+                    student_data['time'] = marked_time.strftime("%H:%M:%S")
                 else:
                     # Mark present (Stand-alone mode, no session??)
                     # If this view is used without a session, we might lack Session FK.
@@ -952,6 +989,7 @@ def process_attendance(request):
                             date=today
                             # Session field is nullable? We assume so for this legacy view.
                         )
+                        marked_today[student.pk] = attendance.time
                         student_data['status'] = 'marked'
                         student_data['time'] = attendance.time.strftime("%H:%M:%S")
                     except Exception as e:
@@ -987,6 +1025,13 @@ def process_attendance(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
 
 
+# Columns used when listing attendance records (history page and its PDF export)
+HISTORY_RECORD_FIELDS = (
+    'date', 'time', 'status', 'marked_by_face',
+    'student__student_id', 'student__name', 'student__class_year',
+)
+
+
 @login_required
 def attendance_history(request):
     """View attendance history with filters and pagination"""
@@ -1008,12 +1053,20 @@ def attendance_history(request):
     if class_filter:
         records = records.filter(student__class_year=class_filter)
     
-    # Calculate statistics
-    total_records = records.count()
-    present_count = records.filter(status='present').count()
+    # Calculate statistics in one query
+    stats = records.aggregate(
+        total=Count('id'),
+        present=Count('id', filter=Q(status='present')),
+    )
+    total_records = stats['total']
+    present_count = stats['present']
+    
+    # Only the columns the table renders
+    records = records.only(*HISTORY_RECORD_FIELDS)
     
     # Paginate results
     paginator = Paginator(records, 50)  # Show 50 records per page
+    paginator.count = total_records  # Already counted above
     
     try:
         paginated_records = paginator.page(page_number)
@@ -1055,10 +1108,16 @@ def export_attendance_pdf(request):
     if class_filter:
         records = records.filter(student__class_year=class_filter)
     
-    # Calculate statistics
-    total_records = records.count()
-    present_count = records.filter(status='present').count()
-    absent_count = records.filter(status='absent').count()
+    # Calculate statistics in one query
+    stats = records.aggregate(
+        total=Count('id'),
+        present=Count('id', filter=Q(status='present')),
+        absent=Count('id', filter=Q(status='absent')),
+    )
+    total_records = stats['total']
+    present_count = stats['present']
+    absent_count = stats['absent']
+    records = records.only(*HISTORY_RECORD_FIELDS)
     
     # Create PDF response
     response = HttpResponse(content_type='application/pdf')
@@ -1107,7 +1166,7 @@ def export_attendance_pdf(request):
     elements.append(Spacer(1, 20))
     
     # Table data
-    if records.exists():
+    if total_records:
         data = [['Student ID', 'Name', 'Class', 'Date', 'Time', 'Status', 'Method']]
         
         for record in records[:500]:  # Limit to 500 records for PDF performance
@@ -0,0 +1,47 @@
+"""
+Gunicorn configuration for RollVision
+
+Usage (picked up automatically from the project root):
+    gunicorn RollVision.wsgi:application
+"""
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Face detection/recognition is CPU-bound, so one worker per core
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+# Split the cores between workers so N workers x N threads don't oversubscribe
+# the CPU on SSD forwards. Set before the app (and OpenCV/NumPy) is imported.
+DNN_THREADS = max(1, multiprocessing.cpu_count() // workers)
+os.environ['OMP_NUM_THREADS'] = str(DNN_THREADS)
+
+accesslog = '-'
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    # With --preload the master has already queried the DB; don't hand its
+    # connection to the workers
+    if 'django.db' in sys.modules:
+        from django.db import connections
+        connections.close_all()
+
+
+def post_fork(server, worker):
+    apps = sys.modules.get('dashboard.apps')
+    if apps is not None:
+        # --preload: the master's log listener thread didn't survive the fork
+        apps.restart_log_listener()
+    
+    face_utils = sys.modules.get('dashboard.face_utils')
+    if face_utils is None:
+        # App is loaded after the fork, so the worker builds its own nets
+        return
+
+    # --preload: rebuild the nets inherited from the master in this worker
+    face_utils.face_recognizer.load_models(num_threads=DNN_THREADS)
+    server.log.info("Worker %s: face models loaded (%s threads)", worker.pid, DNN_THREADS)
@@ -1,7 +1,6 @@
 
 import os
 import django
-import json
 import numpy as np
 import cv2
 from pathlib import Path
@@ -83,7 +82,7 @@ def migrate_encodings():
              new_encoding_data = face_recognizer.encode_face(image, face_rect)
              
              # Update DB
-             encoding_obj.encoding_data = json.dumps(new_encoding_data)
+             encoding_obj.encoding_data = new_encoding_data
              encoding_obj.save()
              
              print(f"   [SUCCESS] Re-encoded.")
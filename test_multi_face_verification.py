@@ -9,7 +9,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RollVision.settings')
 django.setup()
 
 from dashboard.models import Student, AttendanceRecord, FaceEncoding
-from dashboard.face_utils import face_recognizer
+from dashboard.face_utils import face_recognizer, pack_encoding
 from django.test import RequestFactory
 from dashboard.face_views import process_attendance
 
@@ -32,30 +32,26 @@ def test_multi_face_processing():
     # Ensure no attendance today
     AttendanceRecord.objects.filter(student__in=[s1, s2]).delete()
     
-    # Create dummy face encodings with new dlib format
+    # Create dummy face encodings in the stored binary format
     # NOTE: These are dummy encodings for testing structure only
     # Real encodings would come from actual face images
     if not FaceEncoding.objects.filter(student=s1).exists():
-        dummy_encoding_1 = {
-            'encoding': np.random.rand(128).tolist(),  # 128-d vector
-            'version': 'dlib_v1'
-        }
+        dummy_encoding_1 = np.random.rand(128).astype(np.float32)  # 128-d vector
+        dummy_encoding_1 /= np.linalg.norm(dummy_encoding_1)
         FaceEncoding.objects.create(
             student=s1, 
-            encoding_data=json.dumps(dummy_encoding_1),
+            encoding_data=pack_encoding(dummy_encoding_1),
             is_active=True
         )
         s1.is_trained = True
         s1.save()
     
     if not FaceEncoding.objects.filter(student=s2).exists():
-        dummy_encoding_2 = {
-            'encoding': np.random.rand(128).tolist(),  # 128-d vector  
-            'version': 'dlib_v1'
-        }
+        dummy_encoding_2 = np.random.rand(128).astype(np.float32)  # 128-d vector
+        dummy_encoding_2 /= np.linalg.norm(dummy_encoding_2)
         FaceEncoding.objects.create(
             student=s2,
-            encoding_data=json.dumps(dummy_encoding_2),
+            encoding_data=pack_encoding(dummy_encoding_2),
             is_active=True
         )
         s2.is_trained = True
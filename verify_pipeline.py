@@ -9,7 +9,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RollVision.settings')
 import django
 django.setup()
 
-from dashboard.face_utils import face_recognizer
+from dashboard.face_utils import face_recognizer, unpack_encoding
 import cv2
 from django.conf import settings
 
@@ -62,8 +62,9 @@ def test_pipeline():
     enc = face_recognizer.encode_face(image, faces[0])
     print(f"Encoding Time: {time.time()-t0:.3f}s")
     if enc:
-        print(f"Vector Length: {len(enc['encoding'])}")
-        print(f"Version: {enc.get('version')}")
+        vec, _ = unpack_encoding(enc)
+        print(f"Vector Length: {len(vec)}")
+        print(f"Stored Bytes: {len(enc)} (format {enc[0]})")
         
     # 3. Recognition
     results = face_recognizer.recognize_faces(image)